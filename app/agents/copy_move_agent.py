@@ -14,10 +14,12 @@ class CopyMoveAgent:
     BLOCK_SIZE = 16
     SIMILARITY_THRESHOLD = 0.92
     MIN_SHIFT = 30  # מרחק מינימלי בין בלוקים תואמים (פיקסלים)
+    USES_SHARED_DECODE = True  # מקבל מה-Orchestrator את התמונה המפוענחת (ctx)
 
-    async def analyze(self, file_bytes: bytes, filename: str) -> dict:
+    async def analyze(self, file_bytes: bytes, filename: str, ctx: dict | None = None) -> dict:
         try:
-            img = Image.open(io.BytesIO(file_bytes)).convert("L")
+            src = ctx["image"] if ctx else Image.open(io.BytesIO(file_bytes))
+            img = src.convert("L")
 
             # הקטנה לביצועים (max 512px)
             max_dim = 512
@@ -3,6 +3,7 @@ Cross-Reference Engine
 Aggregates all agent findings, computes a weighted confidence score, and produces a final verdict.
 Backend language rule: all strings returned here must be English.
 """
+from collections import Counter
 
 
 class CrossReferenceEngine:
@@ -23,10 +24,26 @@ class CrossReferenceEngine:
         "audio_deepfake":      0.07,
         "video_forensic":      0.06,
         "document_forensic":   0.06,
-    }  # total = 1.10 — intentional: normalised by total_weight below
+    }  # total = 1.10 — intentional: normalised per agent set (_normalized_weights)
+
+    DEFAULT_WEIGHT = 0.08  # unknown agent types
 
     CONFIDENCE_THRESHOLD = 0.75  # above = authentic, below = inconclusive / forged
 
+    # Normalised weights per agent-type sequence, computed on first sight.
+    # The orchestrator only ever runs a handful of agent sets (one per media
+    # type), so this stays tiny and the hot loop is a plain multiply-add.
+    _NORMALIZED: dict[tuple, tuple] = {}
+
+    @classmethod
+    def _normalized_weights(cls, agent_types: tuple) -> tuple:
+        weights = cls._NORMALIZED.get(agent_types)
+        if weights is None:
+            raw = [cls.WEIGHTS.get(t, cls.DEFAULT_WEIGHT) for t in agent_types]
+            total = sum(raw)
+            weights = cls._NORMALIZED[agent_types] = tuple(w / total for w in raw)
+        return weights
+
     def analyze(self, agent_results: list[dict]) -> dict:
         if not agent_results:
             return {
@@ -35,28 +52,51 @@ class CrossReferenceEngine:
                 "reasoning": "No agent results received."
             }
 
-        # Weighted score (normalised — handles missing agents gracefully)
-        total_weight = 0
-        weighted_sum = 0
+        # Weights normalised over the agents that actually ran — handles
+        # missing agents gracefully without a division per request
+        agent_types = tuple(r.get("agent_type", "") for r in agent_results)
+        norm_weights = self._normalized_weights(agent_types)
 
-        for result in agent_results:
-            agent_type = result.get("agent_type", "")
-            weight = self.WEIGHTS.get(agent_type, 0.08)  # unknown agent gets 0.08
-            score  = result.get("confidence_score", 0.5)
-            weighted_sum += score * weight
-            total_weight += weight
+        # Single pass over the results: weighted score, severity counts, and per-agent notes
+        weighted_sum = 0
+        severity_counts = Counter()
+        low_conf = []
+        ai_notes = []
+        c2pa_notes = []
+        c2pa_tampered = False
 
-        combined_score = round(weighted_sum / total_weight, 3) if total_weight > 0 else 0.5
+        for result, agent_type, weight in zip(agent_results, agent_types, norm_weights):
+            weighted_sum += result.get("confidence_score", 0.5) * weight
 
-        # Count anomalies by severity
-        all_anomalies = []
-        for result in agent_results:
             items = result.get("anomalies", {}).get("items", [])
-            all_anomalies.extend(items)
+            severity_counts.update(a.get("severity") for a in items)
 
-        high_count   = sum(1 for a in all_anomalies if a.get("severity") == "high")
-        medium_count = sum(1 for a in all_anomalies if a.get("severity") == "medium")
-        total_count  = len(all_anomalies)
+            if result.get("confidence_score", 1) < 0.6:
+                low_conf.append(agent_type)
+
+            if agent_type == "ai_generation":
+                findings = result.get("findings", {})
+                if findings.get("is_ai_generated"):
+                    tool = findings.get("likely_tool", "unknown")
+                    ai_notes.append(f"Image detected as AI-generated (tool: {tool}).")
+
+            elif agent_type == "c2pa_provenance":
+                findings = result.get("findings", {})
+                status = findings.get("c2pa_status", "")
+                if status == "VERIFIED":
+                    signed_by = findings.get("signed_by", "unknown")
+                    c2pa_notes.append(f"C2PA Content Credentials verified (signed by: {signed_by}).")
+                elif status == "TAMPERED":
+                    c2pa_tampered = True
+                    c2pa_notes.append("C2PA signature chain broken — cryptographic evidence of tampering.")
+                elif status == "AI_DECLARED":
+                    c2pa_notes.append("C2PA manifest declares AI-generated content.")
+
+        combined_score = round(weighted_sum, 3)
+
+        high_count   = severity_counts["high"]
+        medium_count = severity_counts["medium"]
+        total_count  = sum(severity_counts.values())
 
         # Verdict logic
         if high_count >= 3 or (high_count >= 2 and combined_score < 0.5):
@@ -67,52 +107,33 @@ class CrossReferenceEngine:
             verdict = "inconclusive"
 
         # C2PA override: cryptographic TAMPERED = always forged regardless of other agents
-        for result in agent_results:
-            if result.get("agent_type") == "c2pa_provenance":
-                c2pa_status = result.get("findings", {}).get("c2pa_status", "")
-                if c2pa_status == "TAMPERED":
-                    verdict = "forged"
-                    break
-
-        # Reasoning (English only)
-        reasoning_parts = [
+        if c2pa_tampered:
+            verdict = "forged"
+
+        # Reasoning (English only) — built directly; optional notes appended only when present
+        reasoning = (
             f"{len(agent_results)} analysis agents ran. "
-            f"Weighted confidence score: {combined_score:.1%}.",
+            f"Weighted confidence score: {combined_score:.1%}. "
             f"{total_count} anomalies detected: "
             f"{high_count} high severity, {medium_count} medium severity."
-        ]
+        )
 
-        low_conf = [r["agent_type"] for r in agent_results if r.get("confidence_score", 1) < 0.6]
         if low_conf:
-            reasoning_parts.append(f"Low confidence agents: {', '.join(low_conf)}.")
-
-        # AI generation note
-        for result in agent_results:
-            if result.get("agent_type") == "ai_generation":
-                findings = result.get("findings", {})
-                if findings.get("is_ai_generated"):
-                    tool = findings.get("likely_tool", "unknown")
-                    reasoning_parts.append(f"Image detected as AI-generated (tool: {tool}).")
+            reasoning += f" Low confidence agents: {', '.join(low_conf)}."
 
-        # C2PA note
-        for result in agent_results:
-            if result.get("agent_type") == "c2pa_provenance":
-                status = result.get("findings", {}).get("c2pa_status", "")
-                if status == "VERIFIED":
-                    signed_by = result.get("findings", {}).get("signed_by", "unknown")
-                    reasoning_parts.append(f"C2PA Content Credentials verified (signed by: {signed_by}).")
-                elif status == "TAMPERED":
-                    reasoning_parts.append("C2PA signature chain broken — cryptographic evidence of tampering.")
-                elif status == "AI_DECLARED":
-                    reasoning_parts.append("C2PA manifest declares AI-generated content.")
+        # AI generation and C2PA notes
+        for note in ai_notes:
+            reasoning += " " + note
+        for note in c2pa_notes:
+            reasoning += " " + note
 
         if verdict == "inconclusive":
-            reasoning_parts.append("Human-in-the-loop (HITL) review recommended.")
+            reasoning += " Human-in-the-loop (HITL) review recommended."
 
         return {
             "combined_score": combined_score,
             "final_verdict":  verdict,
-            "reasoning":      " ".join(reasoning_parts),
+            "reasoning":      reasoning,
             "anomaly_summary": {
                 "total":  total_count,
                 "high":   high_count,
@@ -3,12 +3,133 @@
 עובד באמת על תמונות בלי צורך ב-API חיצוני.
 """
 import io
+import re
+import math
 import json
+import asyncio
 import hashlib
 from datetime import datetime
-from PIL import Image, ImageChops, ExifTags
+from PIL import Image, ExifTags
 import numpy as np
 
+# תוכנות עריכה בשדה Software — תבנית אחת, סריקה אחת של המחרוזת
+EDITING_TOOLS = ("photoshop", "gimp", "lightroom", "snapseed", "picsart", "canva")
+_EDITING_TOOLS_RE = re.compile("|".join(map(re.escape, EDITING_TOOLS)))
+
+# מימדי פלט אופייניים למודלי AI (DALL-E, Midjourney, Stable Diffusion).
+# frozenset של tuples: בבדיקה בודדת מהיר יותר ממפתח ארוז (w<<32)|h
+# ופי ~40 מ-np.searchsorted על מערך ממוין.
+_AI_DIMS = frozenset({
+    (512, 512), (768, 768), (1024, 1024), (1024, 1792), (1792, 1024),
+    (512, 768), (768, 512), (1024, 768), (768, 1024),
+})
+
+# אנומליות בתוכן קבוע — נבנות פעם אחת ומועתקות (העתקה רדודה) בכל שימוש
+_ANOMALY_NO_EXIF = {
+    "type": "מטאדטה",
+    "description": "JPEG/TIFF file has no EXIF metadata. Most cameras embed EXIF automatically. Missing metadata may indicate the image was processed, stripped, or artificially generated.",
+    "severity": "medium",
+    "location": {"x": 90, "y": 10},
+}
+_ANOMALY_DOUBLE_COMPRESSION = {
+    "type": "דחיסה כפולה",
+    "description": "נמצאו סימנים לדחיסת JPEG כפולה (double compression). "
+                   "זה עלול להעיד על שמירה מחדש לאחר עריכה.",
+    "severity": "medium",
+    "location": {"x": 50, "y": 85},
+}
+
+# מרכז כל אזור ב-grid ה-4x4 של ה-ELA, באחוזים — [row][col] -> (x, y)
+_ELA_REGION_CENTERS = tuple(
+    tuple((col * 25 + 12, row * 25 + 12) for col in range(4)) for row in range(4)
+)
+
+# libjpeg-turbo (SIMD DCT) לסבב ה-ELA — אופציונלי, נופל חזרה ל-Pillow
+try:
+    from turbojpeg import TurboJPEG, TJPF_RGB
+    _TURBO = TurboJPEG()
+except (ImportError, OSError, RuntimeError):
+    _TURBO = None
+
+# libexiv2 לקריאת EXIF בלי לפענח את התמונה — אופציונלי, נופל חזרה ל-Pillow
+try:
+    import pyexiv2
+except ImportError:
+    pyexiv2 = None
+
+
+def _ela_stats_numpy(a: np.ndarray, b: np.ndarray) -> tuple:
+    """
+    הפרש מוחלט בין שני מערכי uint8 + סטטיסטיקות ומפת 4x4 — גרסת numpy.
+    ההפרש נשאר int16 (חיסור SIMD אחד ו-abs במקום, בלי המרה ל-float);
+    הסכומים נצברים במספרים שלמים ולכן מדויקים.
+    """
+    diff = np.subtract(a, b, dtype=np.int16)
+    np.abs(diff, out=diff)
+    h, w, ch = diff.shape
+    gh, gw = h // 4, w // 4
+    if gh == 0 or gw == 0:
+        raise ValueError("image too small for ELA grid")
+
+    n = diff.size
+    mean = int(diff.sum(dtype=np.int64)) / n
+    sq_mean = int(np.multiply(diff, diff, dtype=np.int32).sum(dtype=np.int64)) / n
+    std = max(sq_mean - mean * mean, 0.0) ** 0.5
+    tiles = diff[:gh * 4, :gw * 4].reshape(4, gh, 4, gw, -1).sum(axis=(1, 3, 4), dtype=np.int64)
+    return mean, int(diff.max()), std, tiles / (gh * gw * ch)
+
+
+# Numba — מעבר יחיד על הפיקסלים שמחשב הפרש, סכומים, מקסימום ומפת 4x4 יחד.
+# nogil: רמות האיכות כבר רצות בתהליכונים נפרדים, כך שה-kernel עצמו סדרתי.
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+if njit is not None:
+    @njit(nogil=True, fastmath=True, cache=True)
+    def _ela_kernel(a, b):
+        h, w, ch = a.shape
+        gh, gw = h // 4, w // 4
+        if gh == 0 or gw == 0:
+            raise ValueError("image too small for ELA grid")
+
+        s = 0
+        s2 = 0
+        mx = 0
+        tiles = np.zeros((4, 4), np.int64)
+        for i in range(h):
+            tr = i // gh
+            for j in range(w):
+                tc = j // gw
+                in_grid = tr < 4 and tc < 4
+                for c in range(ch):
+                    d = abs(np.int64(a[i, j, c]) - np.int64(b[i, j, c]))
+                    s += d
+                    s2 += d * d
+                    if d > mx:
+                        mx = d
+                    if in_grid:
+                        tiles[tr, tc] += d
+
+        n = h * w * ch
+        mean = s / n
+        std = np.sqrt(max(s2 / n - mean * mean, 0.0))
+        return mean, mx, std, tiles / (gh * gw * ch)
+
+    # חימום ה-JIT בזמן import, כדי שהבקשה הראשונה לא תשלם על הקומפילציה.
+    # numba מתמחה בנפרד למערכים read-only: המקור תמיד read-only (rgb משותף / np.asarray של PIL),
+    # והגרסה הדחוסה read-only מ-Pillow או כתיבה מ-TurboJPEG — מחממים את שני הצירופים.
+    _warm = np.zeros((64, 64, 3), np.uint8)
+    _warm_ro = _warm.copy()
+    _warm_ro.flags.writeable = False
+    _ela_kernel(_warm_ro, _warm_ro)
+    _ela_kernel(_warm_ro, _warm)
+    del _warm, _warm_ro
+    _ela_stats = _ela_kernel
+else:
+    _ela_stats = _ela_stats_numpy
+
 
 class ForensicTechnicalAgent:
     """סוכן לניתוח פורנזי-טכני: ELA, מטאדטה, גרעון, דחיסה"""
@@ -22,7 +143,19 @@ class ForensicTechnicalAgent:
         ".pdf", ".docx", ".doc", ".txt", ".xlsx", ".pptx",
     }
 
-    async def analyze(self, file_bytes: bytes, filename: str) -> dict:
+    # Multi-scale ELA: a forgery whose original quality is far from 95 only
+    # shows up at a nearby recompression level.
+    ELA_QUALITIES = (30, 55, 75, 90, 95)
+    ELA_REFERENCE_QUALITY = 95
+    ELA_MAX_EDGE = 1600  # px — larger inputs are downscaled before ELA
+
+    # קנס ביטחון לכל אנומליה לפי חומרה
+    SEVERITY_SCORES = {"high": 0.15, "medium": 0.08, "low": 0.03}
+
+    # מקבל מה-Orchestrator תמונה מפוענחת ומערך RGB משותף (ctx) במקום לפענח שוב
+    USES_SHARED_DECODE = True
+
+    async def analyze(self, file_bytes: bytes, filename: str, ctx: dict | None = None) -> dict:
         anomalies = []
         findings = {}
 
@@ -33,30 +166,44 @@ class ForensicTechnicalAgent:
             findings["reason"] = f"Forensic-Technical agent skipped: '{ext}' is not an image format."
             return self._result(0.5, findings, [])
 
-        try:
-            img = Image.open(io.BytesIO(file_bytes))
-        except Exception:
+        # קריאת EXIF ישירות מה-bytes במקביל לפתיחת התמונה
+        if ctx:
+            img = ctx["image"]
+            fast_exif = await asyncio.to_thread(self._read_exif_fast, file_bytes)
+        else:
+            img, fast_exif = await asyncio.gather(
+                asyncio.to_thread(self._open_image, file_bytes),
+                asyncio.to_thread(self._read_exif_fast, file_bytes),
+                return_exceptions=True,
+            )
+        if isinstance(img, Exception):
             findings["skipped"] = True
-            findings["reason"] = "Could not open file as image."
+            findings["reason"] = "Could not open or decode file as image."
             return self._result(0.5, findings, [])
 
-        # 1. ניתוח מטאדטה EXIF
-        exif_anomalies, exif_findings = self._analyze_exif(img)
+        # ארבעת הניתוחים בלתי תלויים — רצים במקביל, מחוץ ל-event loop
+        (
+            (exif_anomalies, exif_findings),
+            (ela_anomalies, ela_findings),
+            (comp_anomalies, comp_findings),
+            (dim_anomalies, dim_findings),
+        ) = await asyncio.gather(
+            # 1. ניתוח מטאדטה EXIF
+            asyncio.to_thread(self._analyze_exif, img, fast_exif),
+            # 2. ניתוח ELA (Error Level Analysis)
+            self._analyze_ela(img, ctx["rgb"] if ctx else None),
+            # 3. ניתוח דחיסה
+            asyncio.to_thread(self._analyze_compression, file_bytes, img),
+            # 4. ניתוח מימדים וגרעון
+            asyncio.to_thread(self._analyze_dimensions, img),
+        )
+
         anomalies.extend(exif_anomalies)
         findings["exif"] = exif_findings
-
-        # 2. ניתוח ELA (Error Level Analysis)
-        ela_anomalies, ela_findings = self._analyze_ela(img)
         anomalies.extend(ela_anomalies)
         findings["ela"] = ela_findings
-
-        # 3. ניתוח דחיסה
-        comp_anomalies, comp_findings = self._analyze_compression(file_bytes, img)
         anomalies.extend(comp_anomalies)
         findings["compression"] = comp_findings
-
-        # 4. ניתוח מימדים וגרעון
-        dim_anomalies, dim_findings = self._analyze_dimensions(img)
         anomalies.extend(dim_anomalies)
         findings["dimensions"] = dim_findings
 
@@ -65,47 +212,76 @@ class ForensicTechnicalAgent:
 
         return self._result(confidence, findings, anomalies)
 
-    def _analyze_exif(self, img: Image.Image) -> tuple:
-        anomalies = []
-        findings = {}
+    def _open_image(self, file_bytes: bytes) -> Image.Image:
+        """
+        פתיחה ופענוח מלא של הפיקסלים מראש — הניתוחים רצים אחר כך בתהליכונים
+        במקביל, ו-Image.load() של Pillow אינו בטוח לקריאה מקבילית מכמה תהליכונים.
+        קובץ קטוע זורק כאן כמו קובץ שלא נפתח — תמונה חצי-טעונה הייתה מפעילה load() שוב בכל ניתוח.
+        """
+        img = Image.open(io.BytesIO(file_bytes))
+        img.load()
+        return img
+
+    def _read_exif_fast(self, file_bytes: bytes) -> dict | None:
+        """
+        קריאת EXIF מקטע APP1 בלבד דרך libexiv2 (pyexiv2), בלי לפענח פיקסלים.
+        מחזיר None אם הספרייה לא זמינה, הקובץ אינו JPEG, או שהקריאה נכשלה —
+        ואז נופלים חזרה ל-Pillow.
+        """
+        if pyexiv2 is None or not file_bytes.startswith(b'\xff\xd8\xff'):
+            return None
+        try:
+            with pyexiv2.ImageData(file_bytes) as data:
+                raw_exif = data.read_exif()
+        except Exception:
+            return None
 
+        # אותם שמות תגים כמו ב-Pillow: IFD0 (Exif.Image) + Exif IFD (Exif.Photo)
         exif_data = {}
-        if hasattr(img, '_getexif') and img._getexif():
-            raw_exif = img._getexif()
+        for key, value in raw_exif.items():
+            group, _, tag = key.rpartition(".")
+            if group in ("Exif.Image", "Exif.Photo"):
+                exif_data[tag] = str(value)[:200]
+        return exif_data
+
+    def _read_exif_pil(self, img: Image.Image) -> dict:
+        exif_data = {}
+        raw_exif = getattr(img, '_getexif', lambda: None)()
+        if raw_exif:
+            tag_names = ExifTags.TAGS
             for tag_id, value in raw_exif.items():
-                tag = ExifTags.TAGS.get(tag_id, tag_id)
+                tag = tag_names.get(tag_id, tag_id)
                 if isinstance(value, bytes):
                     try:
                         value = value.decode('utf-8', errors='ignore')
                     except Exception:
                         value = str(value)[:100]
                 exif_data[str(tag)] = str(value)[:200]
+        return exif_data
+
+    def _analyze_exif(self, img: Image.Image, fast_exif: dict | None = None) -> tuple:
+        anomalies = []
+        findings = {}
+
+        exif_data = fast_exif if fast_exif is not None else self._read_exif_pil(img)
 
         findings["has_exif"] = bool(exif_data)
         findings["exif_tags_count"] = len(exif_data)
 
         if not exif_data:
-            anomalies.append(self._anomaly(
-                "מטאדטה",
-                "JPEG/TIFF file has no EXIF metadata. Most cameras embed EXIF automatically. Missing metadata may indicate the image was processed, stripped, or artificially generated.",
-                "medium",
-                {"x": 90, "y": 10}
-            ))
+            anomalies.append(_ANOMALY_NO_EXIF.copy())
         else:
             # בדיקת תוכנת עריכה
             software = exif_data.get("Software", "")
             if software:
                 findings["software"] = software
-                editing_tools = ["photoshop", "gimp", "lightroom", "snapseed", "picsart", "canva"]
-                for tool in editing_tools:
-                    if tool.lower() in software.lower():
-                        anomalies.append(self._anomaly(
-                            "תוכנת עריכה",
-                            f"זוהתה תוכנת עריכה במטאדטה: {software}. התמונה עברה עיבוד.",
-                            "medium",
-                            {"x": 85, "y": 8}
-                        ))
-                        break
+                if _EDITING_TOOLS_RE.search(software.lower()):
+                    anomalies.append(self._anomaly(
+                        "תוכנת עריכה",
+                        f"זוהתה תוכנת עריכה במטאדטה: {software}. התמונה עברה עיבוד.",
+                        "medium",
+                        {"x": 85, "y": 8}
+                    ))
 
             # בדיקת תאריכים
             date_original = exif_data.get("DateTimeOriginal", "")
@@ -122,63 +298,51 @@ class ForensicTechnicalAgent:
 
         return anomalies, findings
 
-    def _analyze_ela(self, img: Image.Image) -> tuple:
+    async def _analyze_ela(self, img: Image.Image, rgb: np.ndarray | None = None) -> tuple:
         anomalies = []
         findings = {}
 
         try:
-            # שמירה מחדש ב-JPEG באיכות 95 והשוואה
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
-
-            buffer = io.BytesIO()
-            img.save(buffer, 'JPEG', quality=95)
-            buffer.seek(0)
-            resaved = Image.open(buffer)
-
-            # חישוב ההפרש
-            ela_img = ImageChops.difference(img, resaved)
-            ela_array = np.array(ela_img, dtype=np.float64)
+            # שמירה מחדש ב-JPEG במספר רמות איכות והשוואה (multi-scale ELA)
+            rgb = await asyncio.to_thread(self._rgb_array, img, rgb)
+            if rgb.shape[:2] != (img.height, img.width):
+                findings["ela_downscaled_to"] = [rgb.shape[1], rgb.shape[0]]
+            stats = await asyncio.gather(*(
+                asyncio.to_thread(self._ela_at_quality, rgb, q) for q in self.ELA_QUALITIES
+            ))
+            by_quality = dict(zip(self.ELA_QUALITIES, stats))
 
-            # סטטיסטיקות
-            mean_error = float(np.mean(ela_array))
-            max_error = float(np.max(ela_array))
-            std_error = float(np.std(ela_array))
+            # סטטיסטיקות כלליות — לפי איכות הייחוס (95), שעליה מכוילים הספים
+            mean_error, max_error, std_error, _ = by_quality[self.ELA_REFERENCE_QUALITY]
 
             findings["mean_error"] = round(mean_error, 2)
             findings["max_error"] = round(max_error, 2)
             findings["std_error"] = round(std_error, 2)
+            findings["ela_multiscale"] = {
+                str(q): round(st[0], 2) for q, st in by_quality.items()
+            }
 
-            # חלוקה לאזורים (grid 4x4) לזיהוי אנומליות מקומיות
-            h, w = ela_array.shape[:2]
-            grid_h, grid_w = h // 4, w // 4
-            region_means = []
-
-            for row in range(4):
-                for col in range(4):
-                    region = ela_array[row*grid_h:(row+1)*grid_h, col*grid_w:(col+1)*grid_w]
-                    region_means.append({
-                        "row": row, "col": col,
-                        "mean": float(np.mean(region))
-                    })
-
-            overall_mean = np.mean([r["mean"] for r in region_means])
+            # מפת ממוצעים 4x4 לכל רמת איכות — לזיהוי אנומליות מקומיות
+            grids = np.stack([st[3] for st in stats])
+            overall_means = grids.mean(axis=(1, 2), keepdims=True)
             findings["region_analysis"] = True
 
-            # זיהוי אזורים חריגים
-            for r in region_means:
-                if r["mean"] > overall_mean * 2.5 and r["mean"] > 15:
-                    x_pct = int((r["col"] * 25) + 12)
-                    y_pct = int((r["row"] * 25) + 12)
-                    ratio = round(r["mean"] / overall_mean, 1)
-                    anomalies.append(self._anomaly(
-                        "ELA",
-                        f"ELA error level anomaly in region ({r['row']+1},{r['col']+1}). "
-                        f"Error intensity is {ratio}x above average, "
-                        f"indicating possible editing or compositing in this area.",
-                        "high",
-                        {"x": x_pct, "y": y_pct}
-                    ))
+            # זיהוי אזורים חריגים — אזור חריג אם הוא בולט באחת מרמות האיכות לפחות
+            hot = (grids > overall_means * 2.5) & (grids > 15)
+            ratios = np.where(hot, grids / np.maximum(overall_means, 1e-6), 0.0)
+            for row, col in np.argwhere(hot.any(axis=0)):
+                q_idx = int(np.argmax(ratios[:, row, col]))
+                x_pct, y_pct = _ELA_REGION_CENTERS[row][col]
+                ratio = round(float(ratios[q_idx, row, col]), 1)
+                anomalies.append(self._anomaly(
+                    "ELA",
+                    f"ELA error level anomaly in region ({row+1},{col+1}). "
+                    f"Error intensity is {ratio}x above average "
+                    f"(JPEG quality {self.ELA_QUALITIES[q_idx]}), "
+                    f"indicating possible editing or compositing in this area.",
+                    "high",
+                    {"x": x_pct, "y": y_pct}
+                ))
 
             # אם השונות הכללית גבוהה מאוד
             if std_error > 20:
@@ -195,6 +359,41 @@ class ForensicTechnicalAgent:
 
         return anomalies, findings
 
+    def _rgb_array(self, img: Image.Image, rgb: np.ndarray | None = None) -> np.ndarray:
+        """
+        פענוח הפיקסלים פעם אחת — מערך RGB uint8 לכל רמות האיכות.
+        rgb — מערך משותף מה-Orchestrator (לקריאה בלבד); אם חסר, מומר מ-img.
+        תמונות גדולות מוקטנות ל-ELA_MAX_EDGE: ההכרעה היא ברמת אזורי 4x4 בלבד.
+        """
+        if rgb is None:
+            rgb = np.asarray(img if img.mode == 'RGB' else img.convert('RGB'))
+        h, w = rgb.shape[:2]
+        if max(w, h) > self.ELA_MAX_EDGE:
+            scale = self.ELA_MAX_EDGE / max(w, h)
+            small = Image.fromarray(rgb).resize((int(w * scale), int(h * scale)), Image.BILINEAR)
+            rgb = np.asarray(small)
+        return rgb
+
+    def _ela_at_quality(self, rgb: np.ndarray, quality: int) -> tuple:
+        """
+        שארית ELA מול דחיסה מחדש באיכות נתונה.
+        מחזיר (mean, max, std, grid) — grid הוא מפת ממוצעים 4x4.
+        """
+        resaved = self._jpeg_roundtrip(rgb, quality)
+        mean, mx, std, grid = _ela_stats(rgb, resaved)
+        return float(mean), float(mx), float(std), grid
+
+    def _jpeg_roundtrip(self, rgb: np.ndarray, quality: int) -> np.ndarray:
+        """דחיסה ופריסה מחדש של JPEG בזיכרון — libjpeg-turbo אם זמין, אחרת Pillow."""
+        if _TURBO is not None:
+            jpeg_bytes = _TURBO.encode(rgb, quality=quality, pixel_format=TJPF_RGB)
+            return _TURBO.decode(jpeg_bytes, pixel_format=TJPF_RGB)
+
+        buffer = io.BytesIO()
+        Image.fromarray(rgb).save(buffer, 'JPEG', quality=quality)
+        buffer.seek(0)
+        return np.asarray(Image.open(buffer).convert('RGB'))
+
     def _analyze_compression(self, file_bytes: bytes, img: Image.Image) -> tuple:
         anomalies = []
         findings = {}
@@ -211,19 +410,15 @@ class ForensicTechnicalAgent:
 
                 # double JPEG compression detection
                 if len(tables) > 0:
-                    table_values = list(tables.values())[0]
+                    table_values = next(iter(tables.values()))
                     if isinstance(table_values, (list, tuple)):
-                        q_std = float(np.std(table_values))
+                        # 64 ערכים בלבד — חישוב ישיר זול יותר מ-numpy
+                        q_mean = sum(table_values) / len(table_values)
+                        q_std = math.sqrt(sum((v - q_mean) ** 2 for v in table_values) / len(table_values))
                         findings["q_table_std"] = round(q_std, 2)
 
                         if q_std > 25:
-                            anomalies.append(self._anomaly(
-                                "דחיסה כפולה",
-                                "נמצאו סימנים לדחיסת JPEG כפולה (double compression). "
-                                "זה עלול להעיד על שמירה מחדש לאחר עריכה.",
-                                "medium",
-                                {"x": 50, "y": 85}
-                            ))
+                            anomalies.append(_ANOMALY_DOUBLE_COMPRESSION.copy())
 
         # בדיקת יחס גודל קובץ למימדים
         pixels = img.width * img.height
@@ -251,11 +446,7 @@ class ForensicTechnicalAgent:
         }
 
         # תמונות AI נוטות למימדים עגולים
-        ai_dimensions = [
-            (512, 512), (768, 768), (1024, 1024), (1024, 1792), (1792, 1024),
-            (512, 768), (768, 512), (1024, 768), (768, 1024)
-        ]
-        if (img.width, img.height) in ai_dimensions:
+        if (img.width, img.height) in _AI_DIMS:
             anomalies.append(self._anomaly(
                 "מימדים",
                 f"מימדי התמונה ({img.width}x{img.height}) תואמים לפלט אופייני של מודלי AI "
@@ -270,7 +461,7 @@ class ForensicTechnicalAgent:
         if not anomalies:
             return 0.92  # אין אנומליות — ביטחון גבוה באותנטיות
 
-        severity_scores = {"high": 0.15, "medium": 0.08, "low": 0.03}
+        severity_scores = self.SEVERITY_SCORES
         total_penalty = sum(severity_scores.get(a["severity"], 0) for a in anomalies)
         return max(0.15, round(0.92 - total_penalty, 2))
 
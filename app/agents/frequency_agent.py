@@ -14,10 +14,12 @@ class FrequencyAnalysisAgent:
     """ניתוח תדירותי פורנזי."""
 
     AGENT_TYPE = "frequency_analysis"
+    USES_SHARED_DECODE = True  # מקבל מה-Orchestrator את התמונה המפוענחת (ctx)
 
-    async def analyze(self, file_bytes: bytes, filename: str) -> dict:
+    async def analyze(self, file_bytes: bytes, filename: str, ctx: dict | None = None) -> dict:
         try:
-            img = Image.open(io.BytesIO(file_bytes)).convert("L")
+            src = ctx["image"] if ctx else Image.open(io.BytesIO(file_bytes))
+            img = src.convert("L")
 
             # Resize for performance
             max_dim = 512
@@ -2,7 +2,12 @@
 Orchestrator V2 — מנצח ראשי משופר.
 4 שלבים: (1) סוכנים במקביל עם timeout (2) הצלבה (3) Red Team (4) פסיקה סופית.
 """
+import io
 import asyncio
+import hashlib
+import logging
+import numpy as np
+from PIL import Image
 from app.agents.forensic_agent import ForensicTechnicalAgent
 from app.agents.vision_agents import PhysicalAgent, ContextualAgent, AIGenerationAgent
 from app.agents.cross_reference import CrossReferenceEngine
@@ -15,18 +20,70 @@ from app.agents.document_agent import DocumentForensicAgent
 from app.agents.metadata_agent import MetadataConsistencyAgent
 from app.agents.c2pa_agent import C2PAProvenanceAgent
 from app.agents.rppg_agent import RPPGAgent
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
 
 AGENT_TIMEOUT    = 45   # seconds per agent
 RED_TEAM_TIMEOUT = 60   # seconds for red team (calls Claude multiple times)
 
+# BLAKE3 (SIMD) for the in-pipeline file fingerprint — optional, falls back to BLAKE2b
+try:
+    import blake3
+except ImportError:
+    blake3 = None
+
+
+def _fingerprint(file_bytes: bytes) -> str:
+    """Hash the file once per analysis; the digest is shared with every stage that needs it."""
+    if blake3 is not None:
+        return blake3.blake3(file_bytes).hexdigest()
+    return hashlib.blake2b(file_bytes, digest_size=32).hexdigest()
+
 
-async def _run_agent_with_timeout(agent, file_bytes: bytes, filename: str, timeout: int) -> dict:
-    """Run a single agent with a timeout. Returns a safe fallback on timeout/error."""
+def _decode_shared(file_bytes: bytes, file_hash: str) -> dict | None:
+    """
+    Decode the image once for every pixel-level agent.
+    The RGB buffer is marked read-only — agents share it and must copy before mutating.
+    Returns None when the bytes don't decode; each agent then falls back to its own open.
+    """
     try:
-        return await asyncio.wait_for(
-            agent.analyze(file_bytes, filename),
-            timeout=timeout
-        )
+        img = Image.open(io.BytesIO(file_bytes))
+        img.load()
+        rgb = np.asarray(img if img.mode == "RGB" else img.convert("RGB"))
+    except Exception:
+        return None
+    rgb.flags.writeable = False
+    return {"image": img, "rgb": rgb, "file_hash": file_hash}
+
+
+async def _analyze(agent, file_bytes: bytes, filename: str,
+                   decode: asyncio.Task | None, file_hash: str | None) -> dict:
+    """Call agent.analyze with the optional inputs it declares — pixel agents wait for the shared decode."""
+    kwargs = {}
+    if decode is not None and getattr(agent, "USES_SHARED_DECODE", False):
+        # shield — one agent's timeout must not cancel the decode the others are waiting on
+        ctx = await asyncio.shield(decode)
+        if ctx is not None:
+            kwargs["ctx"] = ctx
+    if file_hash is not None and getattr(agent, "USES_FILE_HASH", False):
+        kwargs["file_hash"] = file_hash
+    return await agent.analyze(file_bytes, filename, **kwargs)
+
+
+async def _run_agent_with_timeout(agent, file_bytes: bytes, filename: str, timeout: int,
+                                  decode: asyncio.Task | None = None, sem: asyncio.Semaphore | None = None,
+                                  file_hash: str | None = None) -> dict:
+    """
+    Run a single agent with a timeout. Returns a safe fallback on timeout/error.
+    decode — the shared _decode_shared task; only USES_SHARED_DECODE agents wait for it.
+    """
+    if sem is not None:
+        async with sem:
+            return await _run_agent_with_timeout(agent, file_bytes, filename, timeout, decode, file_hash=file_hash)
+    coro = _analyze(agent, file_bytes, filename, decode, file_hash)
+    try:
+        return await asyncio.wait_for(coro, timeout=timeout)
     except asyncio.TimeoutError:
         return {
             "agent_type": getattr(agent, "AGENT_TYPE", "unknown"),
@@ -40,6 +97,8 @@ async def _run_agent_with_timeout(agent, file_bytes: bytes, filename: str, timeo
             }]},
         }
     except Exception as e:
+        # The failure becomes a neutral result below — log it here, or it is never surfaced
+        logger.warning("agent %s failed: %r", getattr(agent, "AGENT_TYPE", "unknown"), e)
         return {
             "agent_type": getattr(agent, "AGENT_TYPE", "unknown"),
             "confidence_score": 0.5,
@@ -66,6 +125,16 @@ class Orchestrator:
         self.cross_ref  = CrossReferenceEngine()
         self.red_team   = RedTeamAgent()
 
+        # Agents per media type — built once, returned as immutable tuples
+        self._agent_map = {
+            "image":    (self.forensic, self.physical, self.contextual, self.ai_gen,
+                         self.copy_move, self.frequency, self.metadata, self.c2pa),
+            "video":    (self.physical, self.contextual, self.video, self.frequency, self.rppg, self.c2pa),
+            "audio":    (self.audio, self.c2pa),
+            "document": (self.contextual, self.document, self.metadata, self.c2pa),
+        }
+        self._default_agents = (self.forensic,)
+
     async def analyze(self, file_bytes: bytes, filename: str, media_type: str) -> dict:
         """
         ניתוח מלא ב-4 שלבים:
@@ -75,24 +144,41 @@ class Orchestrator:
         4. פסיקה סופית (מתוקנת לאור Red Team)
         """
 
+        file_hash = _fingerprint(file_bytes)
+
         # ── שלב 1: סוכנים במקביל עם timeout לכל אחד ──
         agents = self._select_agents(media_type)
+        # פענוח יחיד של התמונה ברקע — רק סוכני הפיקסלים (forensic / copy-move / frequency) מחכים לו;
+        # סוכני ה-Vision (רשת) מתחילים מיד
+        decode = None
+        if media_type == "image":
+            decode = asyncio.create_task(asyncio.to_thread(_decode_shared, file_bytes, file_hash))
+        # Gate only when the agent set outgrows the cap (Settings.MAX_PARALLEL_AGENTS) —
+        # the per-agent timeout starts once an agent gets a slot
+        cap = get_settings().MAX_PARALLEL_AGENTS
+        sem = asyncio.Semaphore(cap) if len(agents) > cap else None
         tasks  = [
-            _run_agent_with_timeout(agent, file_bytes, filename, AGENT_TIMEOUT)
+            _run_agent_with_timeout(agent, file_bytes, filename, AGENT_TIMEOUT, decode, sem, file_hash)
             for agent in agents
         ]
-        raw_results  = await asyncio.gather(*tasks)
-        agent_results = [r for r in raw_results if isinstance(r, dict)]
+        # _run_agent_with_timeout turns every agent failure into a result dict (and logs it)
+        agent_results = await asyncio.gather(*tasks)
+        ctx = await decode if decode is not None else None
 
-        # ── שלב 2: הצלבה ראשונית ──
-        initial_cross = self.cross_ref.analyze(agent_results)
+        # ── שלב 2: הצלבה ראשונית — ברקע, במקביל לשכבות ה-Red Team שאינן תלויות בה ──
+        cross_task = asyncio.create_task(asyncio.to_thread(self.cross_ref.analyze, agent_results))
+
+        async def _red_team() -> dict:
+            pre = await self.red_team.challenge_pre(
+                file_bytes, filename, agent_results, file_hash=file_hash,
+                image=ctx["image"] if ctx else None,
+            )
+            # shield — timeout של ה-Red Team לא יבטל את ההצלבה עצמה
+            return self.red_team.challenge_finalize(pre, await asyncio.shield(cross_task))
 
         # ── שלב 3: Red Team (עם timeout משלו) ──
         try:
-            red_team_result = await asyncio.wait_for(
-                self.red_team.challenge(file_bytes, filename, agent_results, initial_cross),
-                timeout=RED_TEAM_TIMEOUT
-            )
+            red_team_result = await asyncio.wait_for(_red_team(), timeout=RED_TEAM_TIMEOUT)
         except asyncio.TimeoutError:
             red_team_result = {
                 "summary": "Red Team analysis timed out.",
@@ -112,6 +198,8 @@ class Orchestrator:
                 "confidence_adjustment": 0,
             }
 
+        initial_cross = await cross_task
+
         # ── שלב 4: פסיקה סופית מתוקנת ──
         final = self._final_verdict(initial_cross, red_team_result)
 
@@ -124,17 +212,8 @@ class Orchestrator:
             "hitl_required": final["hitl_required"],
         }
 
-    def _select_agents(self, media_type: str) -> list:
-        if media_type == "image":
-            return [self.forensic, self.physical, self.contextual, self.ai_gen,
-                    self.copy_move, self.frequency, self.metadata, self.c2pa]
-        elif media_type == "video":
-            return [self.physical, self.contextual, self.video, self.frequency, self.rppg, self.c2pa]
-        elif media_type == "audio":
-            return [self.audio, self.c2pa]
-        elif media_type == "document":
-            return [self.contextual, self.document, self.metadata, self.c2pa]
-        return [self.forensic]
+    def _select_agents(self, media_type: str) -> tuple:
+        return self._agent_map.get(media_type, self._default_agents)
 
     def _final_verdict(self, cross_ref: dict, red_team: dict) -> dict:
         """פסיקה סופית — מתחשבת בביקורת הצוות האדום."""
@@ -6,19 +6,38 @@ Layer 2: Adversarial Image Testing — applies forgery techniques, tests if agen
 Layer 3: Cross-Agent Debate — opposing arguments for authentic vs forged
 """
 import io
+import time
+import asyncio
 import hashlib
-from datetime import datetime
-from PIL import Image, ImageFilter
+import functools
+from collections import deque
+from itertools import islice
+from operator import itemgetter
+from PIL import Image, ImageFilter, UnidentifiedImageError
 import numpy as np
 
+# Learning-log fingerprint when the caller didn't pass one (only 16 hex chars are kept).
+# BLAKE3 (SIMD) if installed, else BLAKE2b — same digests as the orchestrator's _fingerprint.
+# Set to hashlib.sha256 to restore the old digests; OpenSSL dispatches it to SHA-NI where available.
+try:
+    from blake3 import blake3 as FILE_HASHER
+except ImportError:
+    FILE_HASHER = functools.partial(hashlib.blake2b, digest_size=32)
+
+# Errors that mean "can't use this image" — the image layers skip instead of failing the stage.
+# DecompressionBombError is not an OSError; ValueError comes from convert() on odd modes.
+_IMAGE_ERRORS = (UnidentifiedImageError, OSError, Image.DecompressionBombError, ValueError)
+
 
 class RedTeamAgent:
     """4-layer adversarial validation system."""
 
     AGENT_TYPE = "red_team"
 
-    # Persistent learning store (in production → DB)
-    history: list = []
+    # Persistent learning store (in production → DB) — shared across requests,
+    # capped so a long-running process doesn't grow it without bound
+    HISTORY_MAXLEN = 1000
+    history: deque = deque(maxlen=HISTORY_MAXLEN)
 
     async def challenge(
         self,
@@ -26,35 +45,88 @@ class RedTeamAgent:
         filename: str,
         agent_results: list[dict],
         cross_reference: dict,
+        file_hash: str | None = None,
+        image: Image.Image | None = None,
+    ) -> dict:
+        """
+        Run all 4 layers and merge results. `file_hash` and the decoded `image`
+        are reused if the caller already has them.
+        """
+        pre = await self.challenge_pre(file_bytes, filename, agent_results, file_hash=file_hash, image=image)
+        return self.challenge_finalize(pre, cross_reference)
+
+    async def challenge_pre(
+        self,
+        file_bytes: bytes,
+        filename: str,
+        agent_results: list[dict],
+        file_hash: str | None = None,
+        image: Image.Image | None = None,
     ) -> dict:
-        """Run all 4 layers and merge results."""
+        """
+        Run the layers that depend only on the agent results and the file —
+        safe to start before the cross-reference verdict is known.
+        The three layers are independent, so they run concurrently off the event loop;
+        history is only read here and appended in `challenge_finalize`.
+        """
+        # The file is parsed once and shared by Layer 0 and Layer 2 (None = not an image)
+        if image is None:
+            image = await asyncio.to_thread(self._open_image_once, file_bytes)
+
+        # Anomaly lists unwrapped and bucketed by severity once, for every layer
+        normalized = self._normalize_results(agent_results)
+        # First entry per agent type, for the O(1) lookups in Layer 0 / Layer 2
+        by_type = {}
+        for n in normalized:
+            by_type.setdefault(n["agent_type"], n)
+
+        L0, L1, L2 = await asyncio.gather(
+            # ── Layer 0: Rule-based (original) — file / agent checks ──
+            asyncio.to_thread(self._layer0_rules, normalized, by_type, image, len(file_bytes)),
+            # ── Layer 1: Statistical Learning ──
+            asyncio.to_thread(self._layer1_statistical, agent_results),
+            # ── Layer 2: Adversarial Image Testing ──
+            asyncio.to_thread(self._layer2_adversarial, image, by_type),
+        )
+
+        return {
+            "agent_results": agent_results,
+            "normalized": normalized,
+            "file_hash": file_hash or FILE_HASHER(file_bytes).hexdigest(),
+            "L0": L0,
+            "L1": L1,
+            "L2": L2,
+        }
+
+    def challenge_finalize(self, pre: dict, cross_reference: dict) -> dict:
+        """Run the verdict-dependent checks on top of `challenge_pre` and merge all layers."""
+        agent_results, normalized = pre["agent_results"], pre["normalized"]
+        L0, L1, L2 = pre["L0"], pre["L1"], pre["L2"]
+
+        # ── Layer 0: Rule-based (original) — verdict check ──
+        L0["challenges"].extend(self._layer0_verdict(normalized, cross_reference))
+
+        # ── Layer 3: Cross-Agent Debate ──
+        L3 = self._layer3_debate(normalized, cross_reference)
 
         all_challenges = []
         all_blind_spots = []
         all_recommendations = []
         adjustments = []
 
-        # ── Layer 0: Rule-based (original) ──
-        L0 = self._layer0_rules(agent_results, cross_reference, file_bytes)
         all_challenges.extend(L0["challenges"])
         all_blind_spots.extend(L0["blind_spots"])
         if L0["adjustment"]:
             adjustments.append(L0["adjustment"])
 
-        # ── Layer 1: Statistical Learning ──
-        L1 = self._layer1_statistical(agent_results, cross_reference)
         all_challenges.extend(L1["challenges"])
         all_recommendations.extend(L1["recommendations"])
         if L1["adjustment"]:
             adjustments.append(L1["adjustment"])
 
-        # ── Layer 2: Adversarial Image Testing ──
-        L2 = await self._layer2_adversarial(file_bytes, agent_results)
         all_challenges.extend(L2["challenges"])
         all_blind_spots.extend(L2["blind_spots"])
 
-        # ── Layer 3: Cross-Agent Debate ──
-        L3 = self._layer3_debate(agent_results, cross_reference)
         all_challenges.extend(L3["challenges"])
         all_recommendations.extend(L3["recommendations"])
         if L3["adjustment"]:
@@ -68,10 +140,10 @@ class RedTeamAgent:
             all_challenges, all_blind_spots, agent_results
         ))
 
-        # Record to history
+        # Record to history (wall-clock ns since epoch — format only if the log is ever exported)
         entry = {
-            "timestamp": datetime.utcnow().isoformat(),
-            "file_hash": hashlib.sha256(file_bytes).hexdigest()[:16],
+            "ts_ns": time.time_ns(),
+            "file_hash": pre["file_hash"][:16],
             "agent_scores": {r["agent_type"]: r.get("confidence_score", 0.5) for r in agent_results},
             "verdict": cross_reference.get("final_verdict", ""),
             "combined_score": cross_reference.get("combined_score", 0.5),
@@ -102,43 +174,45 @@ class RedTeamAgent:
             "summary": self._build_summary(all_challenges, all_blind_spots, all_recommendations, threat, entry["layers_triggered"]),
         }
 
+    @staticmethod
+    def _open_image_once(file_bytes: bytes) -> Image.Image | None:
+        """
+        Open and decode the file once for all layers. Returns None if it is not an image
+        or its pixel data can't be decoded (truncated) — the image layers skip on None.
+        """
+        try:
+            img = Image.open(io.BytesIO(file_bytes))
+            img.load()
+        except _IMAGE_ERRORS:
+            return None
+        return img
+
     # ═══════════════════════════════════════════════════════
     # LAYER 0: Rule-Based Challenges (original)
     # ═══════════════════════════════════════════════════════
-    def _layer0_rules(self, results, cross_ref, file_bytes) -> dict:
+    def _layer0_rules(self, normalized, by_type, img, size_bytes: int) -> dict:
         challenges = []
         blind_spots = []
         adjustment = None
 
         # False positive: ELA from WhatsApp compression
-        forensic = next((r for r in results if r["agent_type"] == "forensic_technical"), None)
+        forensic = by_type.get("forensic_technical")
         if forensic:
-            items = self._get_items(forensic)
-            ela = [a for a in items if "ELA" in a.get("type", "")]
-            if ela:
-                try:
-                    img = Image.open(io.BytesIO(file_bytes))
-                    if img.format == "JPEG":
-                        bpp = len(file_bytes) / (img.width * img.height) if img.width * img.height > 0 else 0
-                        if bpp < 0.3:
-                            challenges.append({
-                                "type": "L0:false_positive_risk",
-                                "challenge": "ELA anomaly may result from legitimate double compression "
-                                           "(social media/WhatsApp). Low bits-per-pixel suggests multiple saves.",
-                                "severity": "medium",
-                                "layer": "rules",
-                            })
-                            adjustment = 0.05
-                except Exception:
-                    pass
+            ela = any("ELA" in t for t in forensic["types"])
+            if ela and img is not None and img.format == "JPEG":
+                bpp = size_bytes / (img.width * img.height) if img.width * img.height > 0 else 0
+                if bpp < 0.3:
+                    challenges.append({
+                        "type": "L0:false_positive_risk",
+                        "challenge": "ELA anomaly may result from legitimate double compression "
+                                   "(social media/WhatsApp). Low bits-per-pixel suggests multiple saves.",
+                        "severity": "medium",
+                        "layer": "rules",
+                    })
+                    adjustment = 0.05
 
         # False negative: missing agents
-        agent_types = [r["agent_type"] for r in results]
-        all_anomaly_types = []
-        for r in results:
-            all_anomaly_types.extend([a.get("type", "") for a in self._get_items(r)])
-
-        if "copy_move" not in agent_types:
+        if "copy_move" not in by_type:
             blind_spots.append({
                 "agent": "system",
                 "issue": "Copy-Move detection was not activated. Common forgery technique may go undetected.",
@@ -147,25 +221,30 @@ class RedTeamAgent:
             })
 
         # Cross-consistency gap
-        scores = {r["agent_type"]: r.get("confidence_score", 0.5) for r in results}
+        scores = {n["agent_type"]: n["score"] for n in normalized}
         if len(scores) >= 2:
-            gap = max(scores.values()) - min(scores.values())
+            high, max_s = max(scores.items(), key=itemgetter(1))
+            low, min_s = min(scores.items(), key=itemgetter(1))
+            gap = max_s - min_s
             if gap > 0.3:
-                high = max(scores, key=scores.get)
-                low = min(scores, key=scores.get)
                 challenges.append({
                     "type": "L0:consistency_gap",
-                    "challenge": f"Significant gap ({gap:.0%}) between {high} ({scores[high]:.0%}) "
-                               f"and {low} ({scores[low]:.0%}). One agent may be unreliable.",
+                    "challenge": f"Significant gap ({gap:.0%}) between {high} ({max_s:.0%}) "
+                               f"and {low} ({min_s:.0%}). One agent may be unreliable.",
                     "severity": "high",
                     "layer": "rules",
                 })
                 adjustment = (adjustment or 0) - 0.03
 
+        return {"challenges": challenges, "blind_spots": blind_spots, "adjustment": adjustment}
+
+    def _layer0_verdict(self, normalized, cross_ref) -> list:
+        challenges = []
+
         # Verdict challenge
         verdict = cross_ref.get("final_verdict", "")
         if verdict == "authentic":
-            total_high = sum(1 for r in results for a in self._get_items(r) if a.get("severity") == "high")
+            total_high = sum(len(n["high"]) for n in normalized)
             if total_high > 0:
                 challenges.append({
                     "type": "L0:verdict_challenge",
@@ -175,12 +254,12 @@ class RedTeamAgent:
                     "layer": "rules",
                 })
 
-        return {"challenges": challenges, "blind_spots": blind_spots, "adjustment": adjustment}
+        return challenges
 
     # ═══════════════════════════════════════════════════════
     # LAYER 1: Statistical Learning Engine
     # ═══════════════════════════════════════════════════════
-    def _layer1_statistical(self, results, cross_ref) -> dict:
+    def _layer1_statistical(self, results) -> dict:
         challenges = []
         recommendations = []
         adjustment = None
@@ -191,7 +270,7 @@ class RedTeamAgent:
                 f"Results will improve with usage."
             ], "adjustment": None}
 
-        recent = self.history[-20:]  # Last 20 analyses
+        recent = list(islice(reversed(self.history), 20))[::-1]  # Last 20 analyses
 
         # Build baselines per agent
         agent_baselines = {}
@@ -260,106 +339,104 @@ class RedTeamAgent:
     # ═══════════════════════════════════════════════════════
     # LAYER 2: Adversarial Image Testing
     # ═══════════════════════════════════════════════════════
-    async def _layer2_adversarial(self, file_bytes, agent_results) -> dict:
+    def _layer2_adversarial(self, img, by_type) -> dict:
         challenges = []
         blind_spots = []
 
-        try:
-            img = Image.open(io.BytesIO(file_bytes))
-            if img.format not in ("JPEG", "PNG"):
-                return {"challenges": [], "blind_spots": []}
+        if img is None or img.format not in ("JPEG", "PNG"):
+            return {"challenges": [], "blind_spots": []}
 
+        # The image may be the orchestrator's shared decode — convert() can still fail here
+        try:
             arr = np.array(img.convert("L"), dtype=np.float64)
-            if arr.shape[0] < 64 or arr.shape[1] < 64:
-                return {"challenges": [], "blind_spots": []}
-
-            # Test 1: Can agents detect subtle brightness manipulation?
-            manipulated = arr.copy()
-            h, w = arr.shape
-            # Brighten a random quadrant by 15%
-            qh, qw = h // 2, w // 2
-            quadrant = np.random.randint(0, 4)
-            regions = [(0, qh, 0, qw), (0, qh, qw, w), (qh, h, 0, qw), (qh, h, qw, w)]
-            r = regions[quadrant]
-            manipulated[r[0]:r[1], r[2]:r[3]] *= 1.15
-            manipulated = np.clip(manipulated, 0, 255)
-
-            # Compare original vs manipulated noise profiles
-            orig_noise = np.std(arr)
-            manip_noise = np.std(manipulated)
-            noise_change = abs(orig_noise - manip_noise) / (orig_noise + 1e-10)
-
-            if noise_change < 0.05:
-                # Manipulation is subtle enough to potentially evade detection
-                blind_spots.append({
-                    "agent": "forensic_technical",
-                    "issue": f"Simulated 15% brightness manipulation in one quadrant produced only "
-                           f"{noise_change:.1%} noise change. Subtle regional edits may evade current ELA sensitivity.",
-                    "risk": "evasion",
-                    "layer": "adversarial",
-                })
+        except _IMAGE_ERRORS:
+            return {"challenges": [], "blind_spots": []}
+        if arr.shape[0] < 64 or arr.shape[1] < 64:
+            return {"challenges": [], "blind_spots": []}
+
+        # Test 1: Can agents detect subtle brightness manipulation?
+        manipulated = arr.copy()
+        h, w = arr.shape
+        # Brighten a random quadrant by 15%
+        qh, qw = h // 2, w // 2
+        quadrant = np.random.randint(0, 4)
+        regions = [(0, qh, 0, qw), (0, qh, qw, w), (qh, h, 0, qw), (qh, h, qw, w)]
+        r = regions[quadrant]
+        manipulated[r[0]:r[1], r[2]:r[3]] *= 1.15
+        manipulated = np.clip(manipulated, 0, 255)
+
+        # Compare original vs manipulated noise profiles
+        orig_noise = np.std(arr)
+        manip_noise = np.std(manipulated)
+        noise_change = abs(orig_noise - manip_noise) / (orig_noise + 1e-10)
+
+        if noise_change < 0.05:
+            # Manipulation is subtle enough to potentially evade detection
+            blind_spots.append({
+                "agent": "forensic_technical",
+                "issue": f"Simulated 15% brightness manipulation in one quadrant produced only "
+                       f"{noise_change:.1%} noise change. Subtle regional edits may evade current ELA sensitivity.",
+                "risk": "evasion",
+                "layer": "adversarial",
+            })
 
-            # Test 2: Clone detection evasion — slight rotation
-            # If copy-move agent found clones, test if a 2-degree rotation would hide them
-            copy_move = next((r for r in agent_results if r["agent_type"] == "copy_move"), None)
-            if copy_move:
-                cm_items = self._get_items(copy_move)
-                if cm_items:
-                    # Real clone found — would slight modification hide it?
-                    challenges.append({
-                        "type": "L2:clone_evasion_test",
-                        "challenge": "Clone regions were detected. A sophisticated forger could apply "
-                                   "subtle rotation (1-3°), scaling, or noise addition to each cloned region "
-                                   "to evade block-matching. Consider adding rotation-invariant matching.",
-                        "severity": "medium",
-                        "layer": "adversarial",
-                    })
-                else:
-                    # No clones found — test by creating one
-                    if w > 128 and h > 128:
-                        # Copy a 32x32 block from one location to another
-                        test = arr.copy()
-                        src_y, src_x = 10, 10
-                        dst_y, dst_x = h // 2, w // 2
-                        block = test[src_y:src_y + 32, src_x:src_x + 32].copy()
-                        test[dst_y:dst_y + 32, dst_x:dst_x + 32] = block
-
-                        # Check if the clone is detectable by comparing block similarity
-                        orig_block = arr[dst_y:dst_y + 32, dst_x:dst_x + 32]
-                        similarity = 1.0 - np.mean(np.abs(block - orig_block)) / 255.0
-                        if similarity > 0.8:
-                            blind_spots.append({
-                                "agent": "copy_move",
-                                "issue": f"Adversarial test: planted a 32x32 clone. "
-                                       f"Source-destination similarity was {similarity:.0%}. "
-                                       f"Agent may miss clones in similar-texture regions.",
-                                "risk": "evasion",
-                                "layer": "adversarial",
-                            })
-
-            # Test 3: Frequency domain evasion
-            # Add very subtle periodic noise that could confuse frequency analysis
-            freq_agent = next((r for r in agent_results if r["agent_type"] == "frequency_analysis"), None)
-            if freq_agent and freq_agent.get("confidence_score", 0) > 0.8:
-                # Agent was confident — but would targeted noise fool it?
+        # Test 2: Clone detection evasion — slight rotation
+        # If copy-move agent found clones, test if a 2-degree rotation would hide them
+        copy_move = by_type.get("copy_move")
+        if copy_move:
+            if copy_move["items"]:
+                # Real clone found — would slight modification hide it?
                 challenges.append({
-                    "type": "L2:frequency_evasion_test",
-                    "challenge": "Frequency agent reported high confidence. Adversarial periodic noise injection "
-                               "at specific DCT frequencies could mask manipulation signatures. "
-                               "Consider multi-scale frequency analysis for robustness.",
-                    "severity": "low",
+                    "type": "L2:clone_evasion_test",
+                    "challenge": "Clone regions were detected. A sophisticated forger could apply "
+                               "subtle rotation (1-3°), scaling, or noise addition to each cloned region "
+                               "to evade block-matching. Consider adding rotation-invariant matching.",
+                    "severity": "medium",
                     "layer": "adversarial",
                 })
+            else:
+                # No clones found — test by creating one
+                if w > 128 and h > 128:
+                    # Copy a 32x32 block from one location to another
+                    test = arr.copy()
+                    src_y, src_x = 10, 10
+                    dst_y, dst_x = h // 2, w // 2
+                    block = test[src_y:src_y + 32, src_x:src_x + 32].copy()
+                    test[dst_y:dst_y + 32, dst_x:dst_x + 32] = block
+
+                    # Check if the clone is detectable by comparing block similarity
+                    orig_block = arr[dst_y:dst_y + 32, dst_x:dst_x + 32]
+                    similarity = 1.0 - np.mean(np.abs(block - orig_block)) / 255.0
+                    if similarity > 0.8:
+                        blind_spots.append({
+                            "agent": "copy_move",
+                            "issue": f"Adversarial test: planted a 32x32 clone. "
+                                   f"Source-destination similarity was {similarity:.0%}. "
+                                   f"Agent may miss clones in similar-texture regions.",
+                            "risk": "evasion",
+                            "layer": "adversarial",
+                        })
 
-        except Exception:
-            pass
+        # Test 3: Frequency domain evasion
+        # Add very subtle periodic noise that could confuse frequency analysis
+        freq_agent = by_type.get("frequency_analysis")
+        if freq_agent and freq_agent["result"].get("confidence_score", 0) > 0.8:
+            # Agent was confident — but would targeted noise fool it?
+            challenges.append({
+                "type": "L2:frequency_evasion_test",
+                "challenge": "Frequency agent reported high confidence. Adversarial periodic noise injection "
+                           "at specific DCT frequencies could mask manipulation signatures. "
+                           "Consider multi-scale frequency analysis for robustness.",
+                "severity": "low",
+                "layer": "adversarial",
+            })
 
         return {"challenges": challenges, "blind_spots": blind_spots}
 
     # ═══════════════════════════════════════════════════════
     # LAYER 3: Cross-Agent Debate
     # ═══════════════════════════════════════════════════════
-    def _layer3_debate(self, results, cross_ref) -> dict:
+    def _layer3_debate(self, normalized, cross_ref) -> dict:
         challenges = []
         recommendations = []
         adjustment = None
@@ -378,14 +455,13 @@ class RedTeamAgent:
             "document_forensic": 1.5,
         }
 
-        for r in results:
-            agent = r["agent_type"]
-            score = r.get("confidence_score", 0.5)
-            items = self._get_items(r)
+        for n in normalized:
+            agent = n["agent_type"]
+            score = n["score"]
             w = weights.get(agent, 1)
 
-            high_anomalies = [a for a in items if a.get("severity") == "high"]
-            med_anomalies = [a for a in items if a.get("severity") == "medium"]
+            high_anomalies = n["high"]
+            med_anomalies = n["medium"]
 
             if score >= 0.75 and not high_anomalies:
                 auth_evidence.append({
@@ -479,18 +555,52 @@ class RedTeamAgent:
             return anomalies.get("items", [])
         return anomalies if isinstance(anomalies, list) else []
 
+    def _normalize_results(self, results) -> list[dict]:
+        """
+        One pass over the agent results: type, score, anomaly items, their high/medium
+        subsets and the set of distinct anomaly types.
+        """
+        normalized = []
+        for r in results:
+            items = self._get_items(r)
+            high, medium = [], []
+            types = set()
+            for a in items:
+                types.add(a.get("type", ""))
+                sev = a.get("severity")
+                if sev == "high":
+                    high.append(a)
+                elif sev == "medium":
+                    medium.append(a)
+            normalized.append({
+                "result": r,
+                "agent_type": r["agent_type"],
+                "score": r.get("confidence_score", 0.5),
+                "items": items,
+                "high": high,
+                "medium": medium,
+                "types": frozenset(types),
+            })
+        return normalized
+
     def _generate_recommendations(self, challenges, blind_spots, results) -> list:
         recs = []
-        high_c = [c for c in challenges if c.get("severity") == "high"]
-        if high_c:
+        if any(c.get("severity") == "high" for c in challenges):
             recs.append("High-severity challenges found — HITL expert verification recommended.")
         if len(blind_spots) >= 2:
             recs.append("Multiple blind spots detected. Consider expanding agent capabilities.")
         return recs
 
     def _calc_threat_level(self, challenges, blind_spots) -> str:
-        high = sum(1 for c in challenges if c.get("severity") == "high")
-        layers = len(set(c.get("layer", "") for c in challenges if c.get("layer")))
+        # Severity count and distinct layers in a single pass over the challenges
+        high = 0
+        layer_set = set()
+        for c in challenges:
+            if c.get("severity") == "high":
+                high += 1
+            if c.get("layer"):
+                layer_set.add(c["layer"])
+        layers = len(layer_set)
         total = len(challenges) + len(blind_spots)
         if high >= 2 or total >= 6 or layers >= 3:
             return "high"
@@ -16,8 +16,37 @@ import os
 import base64
 import json
 import asyncio
+import hashlib
+import functools
+from collections import OrderedDict
 import httpx
 
+try:
+    import blake3
+except ImportError:
+    blake3 = None
+
+# orjson (C, SIMD) לסריאליזציה ולפענוח — fallback ל-json הסטנדרטי
+try:
+    import orjson
+
+    def _dumps(obj) -> bytes:
+        return orjson.dumps(obj)
+
+    _loads = orjson.loads
+except ImportError:
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj).encode()
+
+    _loads = json.loads
+
+# HTTP/2 (multiplexing של ה-fan-out על חיבור אחד) — רק אם החבילה h2 מותקנת
+try:
+    import h2  # noqa: F401
+    _HTTP2 = True
+except ImportError:
+    _HTTP2 = False
+
 
 # ============================================================
 # PROVIDER FLAGS
@@ -40,53 +69,237 @@ PROVIDER_WEIGHTS = {
 # הפרש ציון מינימלי לזיהוי קונפליקט בין providers
 CONFLICT_THRESHOLD = 0.25
 
+# מעל הסף הזה התמונה נשלחת ל-Claude דרך Files API (multipart בינארי, בלי base64 של +33%).
+# מתחתיו ה-round-trip הנוסף של ההעלאה לא משתלם.
+FILES_API_MIN_BYTES = 100_000
+ANTHROPIC_FILES_BETA = "files-api-2025-04-14"
+
+# Hedged request: אם Claude לא ענה תוך HEDGE_DELAY_S, נשלחת גם בקשה ל-provider הגיבוי
+# ומתקבלת התשובה הראשונה. None = כבוי (ברירת מחדל, כל עוד הגיבוי על HOLD).
+# אם ה-provider הגיבוי כבר פעיל ב-PROVIDER_FLAGS הוא רץ במקביל ממילא ואין hedge.
+HEDGE_PROVIDER = None   # "openai" / "gemini"
+HEDGE_DELAY_S  = 3.0
+
+# מודלים לכל provider — חלק גם ממפתח ה-cache
+CLAUDE_MODEL = "claude-sonnet-4-20250514"
+GEMINI_MODEL = "gemini-2.0-flash"
+OPENAI_MODEL = "gpt-4o-mini"
+
+# Cache לתשובות Vision לפי (hash תוכן הקובץ, hash הפרומפטים, providers/מודלים).
+# העלאה חוזרת של אותה תמונה (QA / retry) לא משלמת שוב על ה-round-trip.
+VISION_CACHE_SIZE = 512
+_vision_cache: OrderedDict = OrderedDict()
+
+
+# ============================================================
+# HTTP client משותף
+# client אחד לכל קריאות ה-Vision — חיבורי TCP/TLS נשמרים ב-pool במקום handshake
+# בכל קריאה. ה-client קשור ל-event loop שיצר אותו ונוצר מחדש אם ה-loop התחלף.
+# ============================================================
+_client: httpx.AsyncClient | None = None
+_client_loop = None
+
+
+def _get_client() -> httpx.AsyncClient:
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        _client = httpx.AsyncClient(
+            http2=_HTTP2,
+            timeout=90,
+            limits=httpx.Limits(max_connections=64),
+        )
+        _client_loop = loop
+    return _client
+
+
+# משימות רקע (מחיקת קבצים ב-Files API) — הפניה חזקה עד שהן מסתיימות, אחרת ה-GC עלול לאסוף אותן
+_background_tasks: set = set()
+
+
+def _spawn(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+async def shutdown() -> None:
+    """סגירת ה-client המשותף (נקרא ב-lifespan של האפליקציה) — אחרי שמשימות הרקע סיימו."""
+    global _client
+    if _background_tasks:
+        await asyncio.gather(*_background_tasks, return_exceptions=True)
+    if _client is not None and not _client.is_closed and _client_loop is asyncio.get_running_loop():
+        await _client.aclose()
+    _client = None
+
+
+# ============================================================
+# בניית גופי הבקשות
+# קידוד base64 וסריאליזציית JSON של תמונה בגודל כמה MB חוסמים את
+# ה-event loop — הפונקציות האלה רצות ב-asyncio.to_thread ומחזירות bytes
+# מוכנים ל-content=, כך ש-httpx לא מסריאלז שוב.
+# ============================================================
+
+# (offset, magic, mime) — רק הפורמטים שכל ה-providers מקבלים. פורמט חדש = שורה חדשה.
+_IMAGE_MAGIC = (
+    (0, b'\xff\xd8\xff', "image/jpeg"),
+    (0, b'\x89PNG', "image/png"),
+    (0, b'GIF8', "image/gif"),
+    (8, b'WEBP', "image/webp"),  # RIFF....WEBP
+)
+
+
+def _image_mime(file_bytes: bytes) -> str:
+    for offset, magic, mime in _IMAGE_MAGIC:
+        if file_bytes.startswith(magic, offset):
+            return mime
+    return "image/jpeg"
+
+
+def _claude_body(file_bytes: bytes, system_prompt: str, user_prompt: str, file_id: str | None = None) -> bytes:
+    if file_id:
+        source = {"type": "file", "file_id": file_id}
+    else:
+        source = {
+            "type": "base64",
+            "media_type": _image_mime(file_bytes),
+            "data": base64.b64encode(file_bytes).decode(),
+        }
+    return _dumps({
+        "model": CLAUDE_MODEL,
+        "max_tokens": 2000,
+        "system": system_prompt,
+        "messages": [{
+            "role": "user",
+            "content": [
+                {"type": "image", "source": source},
+                {"type": "text", "text": user_prompt}
+            ]
+        }]
+    })
+
+
+def _gemini_body(file_bytes: bytes, system_prompt: str, user_prompt: str) -> bytes:
+    return _dumps({
+        "contents": [{
+            "parts": [
+                {"inline_data": {"mime_type": _image_mime(file_bytes),
+                                 "data": base64.b64encode(file_bytes).decode()}},
+                {"text": f"{system_prompt}\n\n{user_prompt}"}
+            ]
+        }],
+        "generationConfig": {"maxOutputTokens": 2000, "temperature": 0.1}
+    })
+
+
+def _openai_body(file_bytes: bytes, system_prompt: str, user_prompt: str) -> bytes:
+    b64 = base64.b64encode(file_bytes).decode()
+    return _dumps({
+        "model": OPENAI_MODEL,
+        "max_tokens": 2000,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": [
+                {"type": "text", "text": user_prompt},
+                {"type": "image_url", "image_url": {
+                    "url": f"data:{_image_mime(file_bytes)};base64,{b64}",
+                    "detail": "high"
+                }}
+            ]}
+        ]
+    })
+
 
 # ============================================================
 # קריאות ל-APIs
 # ============================================================
 
-async def _call_claude(file_bytes: bytes, system_prompt: str, user_prompt: str):
-    """קריאה ל-Claude Vision (Anthropic)."""
+# העלאות Files API פעילות לפי hash הקובץ: [upload task, מספר קריאות שמשתמשות בו].
+# שלושת סוכני ה-Vision של אותו ניתוח חולקים העלאה אחת; הקובץ נמחק כשהאחרון מהם סיים.
+_claude_uploads: dict[str, list] = {}
+
+
+async def _claude_upload(client: httpx.AsyncClient, headers: dict, file_bytes: bytes) -> str | None:
+    """העלאת התמונה ל-Files API כ-multipart בינארי. מחזיר file_id, או None אם נכשל (fallback ל-base64)."""
+    try:
+        resp = await client.post(
+            "https://api.anthropic.com/v1/files",
+            headers=headers,
+            files={"file": ("image", file_bytes, _image_mime(file_bytes))},
+        )
+        if not resp.is_success:
+            print(f"[Claude] file upload failed ({resp.status_code}), sending inline: {resp.text[:200]}")
+            return None
+        return resp.json().get("id")
+    except Exception as e:
+        print(f"[Claude] file upload failed, sending inline: {e}")
+        return None
+
+
+async def _claude_delete(client: httpx.AsyncClient, headers: dict, upload: asyncio.Task) -> None:
+    """ניקוי best-effort של הקובץ — מחכה לסיום ההעלאה (גם אם כל הקוראים בוטלו באמצע)."""
+    try:
+        file_id = await upload
+        if file_id:
+            resp = await client.delete(f"https://api.anthropic.com/v1/files/{file_id}", headers=headers)
+            if not resp.is_success:
+                print(f"[Claude] file delete failed ({resp.status_code}): {resp.text[:200]}")
+    except Exception as e:
+        print(f"[Claude] file delete failed: {e}")
+
+
+async def _claude_file_acquire(client: httpx.AsyncClient, headers: dict, file_bytes: bytes,
+                               file_hash: str) -> str | None:
+    """file_id משותף לפי hash — ההעלאה הראשונה נפתחת, השאר מחכים לה. כל acquire מחייב release."""
+    entry = _claude_uploads.get(file_hash)
+    if entry is None:
+        entry = _claude_uploads[file_hash] = [asyncio.create_task(_claude_upload(client, headers, file_bytes)), 0]
+    entry[1] += 1
+    # shield — ביטול של קורא אחד לא מבטל את ההעלאה של האחרים
+    return await asyncio.shield(entry[0])
+
+
+def _claude_file_release(client: httpx.AsyncClient, headers: dict, file_hash: str) -> None:
+    """האחרון שמשחרר מוחק את הקובץ — ברקע, מחוץ לנתיב הקריטי."""
+    entry = _claude_uploads[file_hash]
+    entry[1] -= 1
+    if entry[1] == 0:
+        del _claude_uploads[file_hash]
+        _spawn(_claude_delete(client, headers, entry[0]))
+
+
+async def _call_claude(file_bytes: bytes, system_prompt: str, user_prompt: str, file_hash: str | None = None):
+    """קריאה ל-Claude Vision (Anthropic). file_hash — מפתח ההעלאה המשותפת ל-Files API."""
     api_key = os.getenv("ANTHROPIC_API_KEY", "")
     if not api_key:
         return None
 
-    b64 = base64.b64encode(file_bytes).decode()
-    media_type = "image/jpeg"
-    if file_bytes[:8].startswith(b'\x89PNG'):
-        media_type = "image/png"
-    elif file_bytes[:4] == b'RIFF':
-        media_type = "image/webp"
-
+    headers = {"x-api-key": api_key, "anthropic-version": "2023-06-01"}
     try:
-        async with httpx.AsyncClient(timeout=90) as client:
+        client = _get_client()
+        file_id = None
+        shared = len(file_bytes) >= FILES_API_MIN_BYTES
+        if shared:
+            headers["anthropic-beta"] = ANTHROPIC_FILES_BETA
+            if file_hash is None:
+                file_hash = await asyncio.to_thread(_file_hash, file_bytes)
+        try:
+            if shared:
+                file_id = await _claude_file_acquire(client, headers, file_bytes, file_hash)
+            body = await asyncio.to_thread(_claude_body, file_bytes, system_prompt, user_prompt, file_id)
             resp = await client.post(
                 "https://api.anthropic.com/v1/messages",
-                headers={
-                    "x-api-key": api_key,
-                    "anthropic-version": "2023-06-01",
-                    "content-type": "application/json",
-                },
-                json={
-                    "model": "claude-sonnet-4-20250514",
-                    "max_tokens": 2000,
-                    "system": system_prompt,
-                    "messages": [{
-                        "role": "user",
-                        "content": [
-                            {"type": "image", "source": {
-                                "type": "base64",
-                                "media_type": media_type,
-                                "data": b64,
-                            }},
-                            {"type": "text", "text": user_prompt}
-                        ]
-                    }]
-                }
+                headers={**headers, "content-type": "application/json"},
+                content=body,
             )
             data = resp.json()
-            if "content" in data and len(data["content"]) > 0:
-                return {"provider": "claude", "text": data["content"][0].get("text", "")}
+        finally:
+            # שחרור גם ב-timeout / שגיאה / ביטול — אחרת הקובץ נשאר ב-Files API
+            if shared:
+                _claude_file_release(client, headers, file_hash)
+        if "content" in data and len(data["content"]) > 0:
+            return {"provider": "claude", "text": data["content"][0].get("text", "")}
     except Exception as e:
         print(f"[Claude] error: {e}")
     return None
@@ -101,33 +314,17 @@ async def _call_gemini(file_bytes: bytes, system_prompt: str, user_prompt: str):
     if not api_key:
         return None
 
-    b64 = base64.b64encode(file_bytes).decode()
-    mime_type = "image/jpeg"
-    if file_bytes[:8].startswith(b'\x89PNG'):
-        mime_type = "image/png"
-    elif file_bytes[:4] == b'RIFF':
-        mime_type = "image/webp"
-
-    full_prompt = f"{system_prompt}\n\n{user_prompt}"
-
     try:
-        async with httpx.AsyncClient(timeout=90) as client:
-            resp = await client.post(
-                f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={api_key}",
-                headers={"content-type": "application/json"},
-                json={
-                    "contents": [{
-                        "parts": [
-                            {"inline_data": {"mime_type": mime_type, "data": b64}},
-                            {"text": full_prompt}
-                        ]
-                    }],
-                    "generationConfig": {"maxOutputTokens": 2000, "temperature": 0.1}
-                }
-            )
-            data = resp.json()
-            text = data["candidates"][0]["content"]["parts"][0]["text"]
-            return {"provider": "gemini", "text": text}
+        body = await asyncio.to_thread(_gemini_body, file_bytes, system_prompt, user_prompt)
+        client = _get_client()
+        resp = await client.post(
+            f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}:generateContent?key={api_key}",
+            headers={"content-type": "application/json"},
+            content=body,
+        )
+        data = resp.json()
+        text = data["candidates"][0]["content"]["parts"][0]["text"]
+        return {"provider": "gemini", "text": text}
     except Exception as e:
         print(f"[Gemini] error: {e}")
     return None
@@ -142,66 +339,129 @@ async def _call_openai(file_bytes: bytes, system_prompt: str, user_prompt: str):
     if not api_key:
         return None
 
-    b64 = base64.b64encode(file_bytes).decode()
-
     try:
-        async with httpx.AsyncClient(timeout=90) as client:
-            resp = await client.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers={"Authorization": f"Bearer {api_key}"},
-                json={
-                    "model": "gpt-4o-mini",
-                    "max_tokens": 2000,
-                    "messages": [
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": [
-                            {"type": "text", "text": user_prompt},
-                            {"type": "image_url", "image_url": {
-                                "url": f"data:image/jpeg;base64,{b64}",
-                                "detail": "high"
-                            }}
-                        ]}
-                    ]
-                }
-            )
-            data = resp.json()
-            text = data["choices"][0]["message"]["content"]
-            return {"provider": "openai", "text": text}
+        body = await asyncio.to_thread(_openai_body, file_bytes, system_prompt, user_prompt)
+        client = _get_client()
+        resp = await client.post(
+            "https://api.openai.com/v1/chat/completions",
+            headers={"Authorization": f"Bearer {api_key}", "content-type": "application/json"},
+            content=body,
+        )
+        data = resp.json()
+        text = data["choices"][0]["message"]["content"]
+        return {"provider": "openai", "text": text}
     except Exception as e:
         print(f"[OpenAI] error: {e}")
     return None
 
 
+PROVIDER_CALLS = {
+    "claude": _call_claude,
+    "gemini": _call_gemini,
+    "openai": _call_openai,
+}
+
+
+async def _call_hedged(primary, backup, file_bytes: bytes, system_prompt: str, user_prompt: str):
+    """
+    מריץ את primary; אם לא ענה תוך HEDGE_DELAY_S (או נכשל) — מפעיל גם את backup.
+    מחזיר את התשובה התקינה הראשונה ומבטל את המפסיד.
+    """
+    pending = {asyncio.create_task(primary(file_bytes, system_prompt, user_prompt))}
+    # try/finally מכסה גם את ההמתנה הראשונה — ביטול של הקורא (wait_for של הסוכן) מבטל גם את primary
+    try:
+        done, pending = await asyncio.wait(pending, timeout=HEDGE_DELAY_S)
+        for t in done:
+            if not t.cancelled() and t.exception() is None and t.result() is not None:
+                return t.result()
+
+        pending.add(asyncio.create_task(backup(file_bytes, system_prompt, user_prompt)))
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for t in done:
+                if not t.cancelled() and t.exception() is None and t.result() is not None:
+                    return t.result()
+        return None
+    finally:
+        for t in pending:
+            t.cancel()
+
+
 # ============================================================
 # מנוע ה-Ensemble
 # ============================================================
 
 def _parse_json_response(text: str):
-    """מנתח תשובת JSON מכל provider."""
+    """
+    מנתח תשובת JSON מכל provider.
+    חותך מה-{ הראשון עד ה-} האחרון — מכסה ```json fences (גם בלי שורה חדשה)
+    וטקסט מקדים כמו "Here is the JSON:".
+    """
+    start = text.find("{")
+    end = text.rfind("}")
+    if start < 0 or end <= start:
+        return None
     try:
-        text = text.strip()
-        if text.startswith("```"):
-            text = text.split("\n", 1)[1].rsplit("```", 1)[0]
-        return json.loads(text)
+        return _loads(text[start:end + 1])
     except Exception:
         return None
 
 
-async def _call_ensemble(file_bytes: bytes, system_prompt: str, user_prompt: str) -> dict:
+def _file_hash(file_bytes: bytes) -> str:
+    """Same digest as the Orchestrator's fingerprint — BLAKE3, or BLAKE2b-256 without it."""
+    return (blake3.blake3(file_bytes) if blake3 is not None
+            else hashlib.blake2b(file_bytes, digest_size=32)).hexdigest()
+
+
+def _cache_key(file_hash: str, system_prompt: str, user_prompt: str) -> tuple:
+    """מפתח cache: hash הקובץ, hash הפרומפטים, וה-providers/מודלים הפעילים."""
+    prompt_hash = hashlib.blake2b(f"{system_prompt}\x00{user_prompt}".encode(), digest_size=16).hexdigest()
+    providers = tuple(sorted(p for p, on in PROVIDER_FLAGS.items() if on))
+    return (file_hash, prompt_hash, providers, CLAUDE_MODEL, GEMINI_MODEL, OPENAI_MODEL, HEDGE_PROVIDER)
+
+
+async def _call_ensemble(file_bytes: bytes, system_prompt: str, user_prompt: str,
+                         file_hash: str | None = None) -> dict:
     """
     שולח לכל ה-providers הפעילים (לפי PROVIDER_FLAGS) במקביל.
     מחזיר dict עם תשובות גולמיות ורשימת providers שהגיבו.
+    רק ensemble שלם (כל provider פעיל ענה) נשמר ב-cache (LRU) — כשל זמני של provider
+    אחד לא ננעל לכל חיי התהליך. file_hash — ה-hash שה-Orchestrator כבר חישב.
     """
+    if file_hash is None:
+        file_hash = await asyncio.to_thread(_file_hash, file_bytes)
+    key = _cache_key(file_hash, system_prompt, user_prompt)
+    cached = _vision_cache.get(key)
+    if cached is not None:
+        _vision_cache.move_to_end(key)
+        return cached
+
+    ensemble = await _call_providers(file_bytes, system_prompt, user_prompt, file_hash)
+    if ensemble["responses"] and ensemble["complete"]:
+        _vision_cache[key] = ensemble
+        if len(_vision_cache) > VISION_CACHE_SIZE:
+            _vision_cache.popitem(last=False)
+    return ensemble
+
+
+async def _call_providers(file_bytes: bytes, system_prompt: str, user_prompt: str,
+                          file_hash: str | None = None) -> dict:
+    """קריאה בפועל ל-providers הפעילים במקביל (ללא cache)."""
     tasks = {}
     if PROVIDER_FLAGS.get("claude"):
-        tasks["claude"] = _call_claude(file_bytes, system_prompt, user_prompt)
+        claude = functools.partial(_call_claude, file_hash=file_hash)
+        if HEDGE_PROVIDER in PROVIDER_CALLS and not PROVIDER_FLAGS.get(HEDGE_PROVIDER):
+            tasks["claude"] = _call_hedged(claude, PROVIDER_CALLS[HEDGE_PROVIDER],
+                                           file_bytes, system_prompt, user_prompt)
+        else:
+            tasks["claude"] = claude(file_bytes, system_prompt, user_prompt)
     if PROVIDER_FLAGS.get("gemini"):
         tasks["gemini"] = _call_gemini(file_bytes, system_prompt, user_prompt)
     if PROVIDER_FLAGS.get("openai"):
         tasks["openai"] = _call_openai(file_bytes, system_prompt, user_prompt)
 
     if not tasks:
-        return {"responses": [], "providers_used": []}
+        return {"responses": [], "providers_used": [], "complete": False}
 
     results = await asyncio.gather(*tasks.values(), return_exceptions=True)
     responses = []
@@ -213,7 +473,8 @@ async def _call_ensemble(file_bytes: bytes, system_prompt: str, user_prompt: str
 
     return {
         "responses": responses,
-        "providers_used": [r["provider"] for r in responses]
+        "providers_used": [r["provider"] for r in responses],
+        "complete": len(responses) == len(tasks),
     }
 
 
@@ -276,6 +537,7 @@ def _merge_parsed_results(parsed_list: list) -> dict:
 # ============================================================
 class PhysicalAgent:
     AGENT_TYPE = "physical"
+    USES_FILE_HASH = True  # מקבל מה-Orchestrator את ה-hash של הקובץ — מפתח ה-cache בלי hash נוסף
 
     SYSTEM_PROMPT = """You are a forensic physics expert analyzing images for authenticity.
 Analyze the image and look for:
@@ -292,8 +554,8 @@ If the image appears authentic with no issues, return empty anomalies array and
 
     USER_PROMPT = "Analyze this image for physical inconsistencies -- shadows, lighting, perspective, reflections, and proportions. Be thorough but avoid false positives."
 
-    async def analyze(self, file_bytes: bytes, filename: str) -> dict:
-        ensemble = await _call_ensemble(file_bytes, self.SYSTEM_PROMPT, self.USER_PROMPT)
+    async def analyze(self, file_bytes: bytes, filename: str, file_hash: str | None = None) -> dict:
+        ensemble = await _call_ensemble(file_bytes, self.SYSTEM_PROMPT, self.USER_PROMPT, file_hash)
 
         parsed_list = []
         for r in ensemble["responses"]:
@@ -334,6 +596,7 @@ If the image appears authentic with no issues, return empty anomalies array and
 # ============================================================
 class ContextualAgent:
     AGENT_TYPE = "contextual"
+    USES_FILE_HASH = True  # מקבל מה-Orchestrator את ה-hash של הקובץ — מפתח ה-cache בלי hash נוסף
 
     SYSTEM_PROMPT = """You are a historical and contextual forensic expert. Analyze the image for:
 1. Elements that don't match the apparent time period (uniforms, weapons, technology, vehicles)
@@ -349,8 +612,8 @@ If nothing appears anachronistic, return empty anomalies and high confidence_sco
 
     USER_PROMPT = "Analyze this image for historical and contextual inconsistencies. Identify any element that doesn't belong to the apparent time period, location, or cultural context."
 
-    async def analyze(self, file_bytes: bytes, filename: str) -> dict:
-        ensemble = await _call_ensemble(file_bytes, self.SYSTEM_PROMPT, self.USER_PROMPT)
+    async def analyze(self, file_bytes: bytes, filename: str, file_hash: str | None = None) -> dict:
+        ensemble = await _call_ensemble(file_bytes, self.SYSTEM_PROMPT, self.USER_PROMPT, file_hash)
 
         parsed_list = []
         for r in ensemble["responses"]:
@@ -389,6 +652,7 @@ If nothing appears anachronistic, return empty anomalies and high confidence_sco
 # ============================================================
 class AIGenerationAgent:
     AGENT_TYPE = "ai_generation"
+    USES_FILE_HASH = True  # מקבל מה-Orchestrator את ה-hash של הקובץ — מפתח ה-cache בלי hash נוסף
 
     SYSTEM_PROMPT = """You are an expert in detecting AI-generated images. Analyze the image and determine:
 1. Is this image AI-generated? (DALL-E, Midjourney, Stable Diffusion, Firefly, Sora, etc.)
@@ -400,8 +664,8 @@ RESPOND ONLY WITH JSON in this exact format:
 
     USER_PROMPT = "Determine if this image was generated by AI. If so, identify the likely tool and all telltale signs."
 
-    async def analyze(self, file_bytes: bytes, filename: str) -> dict:
-        ensemble = await _call_ensemble(file_bytes, self.SYSTEM_PROMPT, self.USER_PROMPT)
+    async def analyze(self, file_bytes: bytes, filename: str, file_hash: str | None = None) -> dict:
+        ensemble = await _call_ensemble(file_bytes, self.SYSTEM_PROMPT, self.USER_PROMPT, file_hash)
 
         parsed_list = []
         for r in ensemble["responses"]:
@@ -1,26 +1,37 @@
 import asyncio
 import uuid
 import re
-from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException, Request
+from pathlib import Path
+from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException, Request, Response
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
+from app.core.config import get_settings
 from app.core.database import get_db
-from app.models.models import Case, AgentResult
-from app.api.schemas import VerifyResponse, CaseResponse, AgentResultResponse, AnomalyDetail, HITLApprovalRequest
-from app.services.storage import compute_sha256, detect_media_type, save_file_locally, validate_magic_bytes
+from app.models.models import Case, Report, uuid7
+from app.api.schemas import VerifyResponse, CaseResponse, AgentResultResponse, AnomalyDetail, HITLApprovalRequest, RedTeamResponse
+from app.services.storage import (
+    compute_sha256, detect_media_type, read_upload_hashed, save_file_locally, save_report_locally, validate_magic_bytes,
+)
+from app.services.verification import ANALYSIS_TIMEOUT, analyze_case
 
-router  = APIRouter(prefix="/v1", tags=["verify"])
-limiter = Limiter(key_func=get_remote_address)
+router   = APIRouter(prefix="/v1", tags=["verify"])
+settings = get_settings()
+limiter  = Limiter(key_func=get_remote_address)
 
 # ── Security constants ────────────────────────────────────────────────────────
 MAX_FILE_SIZE   = 50 * 1024 * 1024   # 50 MB
 MAX_IMAGE_DIM   = 4096               # px — PIL resize threshold
-ANALYSIS_TIMEOUT = 120               # seconds per full analysis
 AGENT_TIMEOUT    = 45                # seconds per single agent
+MAX_BATCH_FILES  = 20                # files per /verify/batch request
 CLIENT_ID_RE     = re.compile(r'^[a-zA-Z0-9_\-\.@]{3,128}$')
 
+# Case states whose report can no longer change — generated once, then served from disk
+REPORT_CACHEABLE_STATUSES = ("completed", "hitl_pending")
+
 
 def _validate_client_id(client_id: str) -> str:
     if not CLIENT_ID_RE.match(client_id):
@@ -31,6 +42,13 @@ def _validate_client_id(client_id: str) -> str:
     return client_id
 
 
+def _parse_case_id(case_id: str) -> uuid.UUID:
+    try:
+        return uuid.UUID(case_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="case_id לא תקין")
+
+
 def _resize_image_if_needed(file_bytes: bytes, filename: str) -> bytes:
     """Resize images larger than MAX_IMAGE_DIM to prevent OOM."""
     ext = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
@@ -57,10 +75,72 @@ def _resize_image_if_needed(file_bytes: bytes, filename: str) -> bytes:
         return file_bytes   # fallback — return original
 
 
+async def _prepare_upload(filename: str | None, file_bytes: bytes, file_hash: str) -> tuple[str, bytes, str]:
+    """
+    Steps 3-5 of a submission — nothing is written: magic-byte check, image resize, rehash.
+    Returns (media_type, bytes to store and analyse, their SHA-256).
+    """
+    # ── 3. Magic bytes validation (anti-spoofing) ─────────────────────────
+    magic_type, fmt = validate_magic_bytes(file_bytes, filename or "upload")
+    media_type = magic_type  # use magic-confirmed type, not just extension
+
+    # ── 4. Resize images to prevent OOM — decode + LANCZOS off the event loop ──
+    if media_type == "image":
+        resized = await asyncio.to_thread(_resize_image_if_needed, file_bytes, filename or "")
+        # ── 5. Chain of custody hash is of the stored/analysed bytes — rehash if resized ──
+        if resized is not file_bytes:
+            file_bytes = resized
+            file_hash = await asyncio.to_thread(compute_sha256, file_bytes)
+
+    return media_type, file_bytes, file_hash
+
+
+async def _register_upload(
+    db: AsyncSession, client_id: str, filename: str | None, media_type: str, file_bytes: bytes, file_hash: str,
+) -> tuple[Case, bytes | None]:
+    """
+    Steps 5b-7 for a prepared upload: SHA-256 dedup, save, new pending case.
+    Returns (new case, bytes to analyse) — the case is added to the session, not committed —
+    or (existing completed case, None) for a duplicate file.
+    """
+    # ── 5b. SHA-256 deduplication — return existing case immediately ───────
+    # first(), not one_or_none() — older data may hold several completed cases per hash
+    existing = await db.execute(
+        select(Case).where(Case.file_hash == file_hash).where(Case.status == "completed").limit(1)
+    )
+    existing_case = existing.scalars().first()
+    if existing_case:
+        return existing_case, None
+
+    # ── 6. Save file ───────────────────────────────────────────────────────
+    file_url = await save_file_locally(file_bytes, filename)
+
+    # ── 7. Create case with UUIDv7 ─────────────────────────────────────────
+    case = Case(
+        id=uuid7(),
+        client_id=client_id,
+        media_type=media_type,
+        file_url=file_url,
+        file_hash=file_hash,
+        status="pending",
+    )
+    db.add(case)
+    return case, file_bytes
+
+
+def _duplicate_response(case: Case) -> VerifyResponse:
+    return VerifyResponse(
+        case_id=case.id,
+        status="completed",
+        message=f"Duplicate file — returning existing analysis ({case.verdict})",
+    )
+
+
 @router.post("/verify", response_model=VerifyResponse)
 @limiter.limit("10/minute;50/hour;200/day")   # per IP — adjust in Sprint 3 with JWT tiers
 async def submit_verification(
     request: Request,
+    response: Response,
     file: UploadFile = File(...),
     client_id: str = Form(...),
     context: str = Form(default=None),
@@ -71,118 +151,43 @@ async def submit_verification(
     # ── 1. Validate client_id ──────────────────────────────────────────────
     _validate_client_id(client_id)
 
-    # ── 2. Read & size-check ───────────────────────────────────────────────
-    file_bytes = await file.read()
+    # ── 2. Read & size-check — hashed chunk by chunk while reading ────────
+    file_bytes, file_hash = await read_upload_hashed(file, MAX_FILE_SIZE)
     if len(file_bytes) == 0:
         raise HTTPException(status_code=400, detail="הקובץ ריק")
-    if len(file_bytes) > MAX_FILE_SIZE:
-        raise HTTPException(
-            status_code=413,
-            detail=f"קובץ גדול מדי. מקסימום {MAX_FILE_SIZE // (1024*1024)}MB"
-        )
-
-    # ── 3. Magic bytes validation (anti-spoofing) ─────────────────────────
-    magic_type, fmt = validate_magic_bytes(file_bytes, file.filename or "upload")
-    media_type = magic_type  # use magic-confirmed type, not just extension
 
-
-    # ── 4. Resize images to prevent OOM ───────────────────────────────────
-    if media_type == "image":
-        file_bytes = _resize_image_if_needed(file_bytes, file.filename or "")
-
-    # ── 5. Chain of custody hash ───────────────────────────────────────────
-    file_hash = compute_sha256(file_bytes)
-
-    # ── 5b. SHA-256 deduplication — return existing case immediately ───────
-    existing = await db.execute(select(Case).where(Case.file_hash == file_hash).where(Case.status == "completed"))
-    existing_case = existing.scalar_one_or_none()
-    if existing_case:
+    # ── 3-7. Validate, resize, dedup, save, create case ──────────────────
+    prepared = await _prepare_upload(file.filename, file_bytes, file_hash)
+    case, file_bytes = await _register_upload(db, client_id, file.filename, *prepared)
+    if file_bytes is None:
+        return _duplicate_response(case)
+
+    # ── 8. Queue for the Celery worker — or analyse inline ────────────────
+    if settings.ASYNC_VERIFICATION:
+        await db.commit()   # the worker reads the case from its own session
+        from app.core.celery_app import run_verification
+        run_verification.delay(str(case.id), file.filename)
+        response.status_code = 202
         return VerifyResponse(
-            case_id=existing_case.id,
-            status="completed",
-            message=f"Duplicate file — returning existing analysis ({existing_case.verdict})",
+            case_id=case.id,
+            status="queued",
+            message=f"הניתוח נכנס לתור — סטטוס ב-GET /v1/verify/{case.id}",
         )
 
-    # ── 6. Save file ───────────────────────────────────────────────────────
-    file_url = await save_file_locally(file_bytes, file.filename)
-
-    # ── 7. Create case with UUID4 ──────────────────────────────────────────
-    case = Case(
-        id=str(uuid.uuid4()),
-        client_id=client_id,
-        media_type=media_type,
-        file_url=file_url,
-        file_hash=file_hash,
-        status="pending",
-    )
-    db.add(case)
+    # Inline: commit the case as "processing" first — the dedup SELECT has already begun a
+    # transaction, and it must not hold a pooled connection for the length of the analysis
+    case.status = "processing"
     await db.commit()
-    await db.refresh(case)
-
-    # ── 8. Run analysis with hard timeout ─────────────────────────────────
-    from app.agents.orchestrator import Orchestrator
-    orchestrator = Orchestrator()
     try:
-        analysis = await asyncio.wait_for(
-            orchestrator.analyze(file_bytes, file.filename, media_type),
-            timeout=ANALYSIS_TIMEOUT
-        )
+        analysis = await analyze_case(db, case, file_bytes, file.filename)
     except asyncio.TimeoutError:
-        case.status = "timeout"
-        case.verdict = "inconclusive"
-        case.confidence_score = 0.0
-        case.hitl_required = True
-        await db.commit()
         raise HTTPException(
             status_code=504,
             detail=f"הניתוח לא הושלם תוך {ANALYSIS_TIMEOUT} שניות. נא לנסות שוב."
         )
     except Exception as e:
-        case.status = "error"
-        case.verdict = "inconclusive"
-        case.confidence_score = 0.0
-        case.hitl_required = True
-        await db.commit()
         raise HTTPException(status_code=500, detail=f"שגיאה בניתוח: {str(e)[:200]}")
 
-    # ── 9. Save agent results ──────────────────────────────────────────────
-    from app.models.models import AgentResult, CrossReferenceResult
-    for ar in analysis["agent_results"]:
-        agent_result = AgentResult(
-            case_id=case.id,
-            agent_type=ar["agent_type"],
-            findings=ar.get("findings", {}),
-            anomalies=ar.get("anomalies", {}),
-            confidence_score=ar["confidence_score"],
-        )
-        db.add(agent_result)
-
-    cross_ref = CrossReferenceResult(
-        case_id=case.id,
-        combined_score=analysis["confidence_score"],
-        reasoning=analysis["cross_reference"]["reasoning"],
-        final_verdict=analysis["verdict"],
-    )
-    db.add(cross_ref)
-
-    # Red Team as AgentResult
-    rt = analysis.get("red_team", {})
-    if rt:
-        rt_result = AgentResult(
-            case_id=case.id,
-            agent_type="red_team",
-            findings={"summary": rt.get("summary", ""), "threat_level": rt.get("threat_level", "low")},
-            anomalies={"challenges": rt.get("challenges", []), "blind_spots": rt.get("blind_spots", []), "recommendations": rt.get("recommendations", [])},
-            confidence_score=1.0 - abs(rt.get("confidence_adjustment", 0)),
-        )
-        db.add(rt_result)
-
-    case.status          = "completed"
-    case.confidence_score = analysis["confidence_score"]
-    case.verdict         = analysis["verdict"]
-    case.hitl_required   = analysis["hitl_required"]
-    await db.commit()
-
     return VerifyResponse(
         case_id=case.id,
         status="completed",
@@ -190,36 +195,84 @@ async def submit_verification(
     )
 
 
+@router.post("/verify/batch", response_model=list[VerifyResponse], status_code=202)
+@limiter.limit("2/minute;10/hour;20/day")
+async def submit_verification_batch(
+    request: Request,
+    files: list[UploadFile] = File(...),
+    client_id: str = Form(...),
+    db: AsyncSession = Depends(get_db),
+):
+    """שליחת מספר קבצים בבת אחת — כל קובץ הופך למקרה נפרד בתור ה-worker"""
+    _validate_client_id(client_id)
+    if not settings.ASYNC_VERIFICATION:
+        raise HTTPException(status_code=503, detail="Batch verification requires the worker queue (ASYNC_VERIFICATION).")
+    if len(files) > MAX_BATCH_FILES:
+        raise HTTPException(status_code=400, detail=f"עד {MAX_BATCH_FILES} קבצים בבקשה אחת")
+
+    # All files are read and hashed concurrently — the per-chunk SHA-256 runs in worker
+    # threads with the GIL released, so the digests proceed in parallel across cores
+    uploads = await asyncio.gather(*(read_upload_hashed(f, MAX_FILE_SIZE) for f in files))
+
+    # Validate every file before anything is written — a bad file must not orphan earlier ones
+    for f, (file_bytes, _) in zip(files, uploads):
+        if len(file_bytes) == 0:
+            raise HTTPException(status_code=400, detail=f"הקובץ ריק: {f.filename}")
+    # Resizes run in worker threads — prepare the whole batch concurrently
+    prepared = await asyncio.gather(*(_prepare_upload(f.filename, b, h) for f, (b, h) in zip(files, uploads)))
+
+    responses, queued = [], []
+    in_batch: dict[str, Case] = {}   # digest → case created earlier in this batch
+    for f, (media_type, file_bytes, file_hash) in zip(files, prepared):
+        if file_hash in in_batch:
+            case = in_batch[file_hash]
+            responses.append(VerifyResponse(
+                case_id=case.id,
+                status="queued",
+                message="Duplicate file in this batch — shares the case above",
+            ))
+            continue
+        case, file_bytes = await _register_upload(db, client_id, f.filename, media_type, file_bytes, file_hash)
+        if file_bytes is None:
+            responses.append(_duplicate_response(case))
+            continue
+        in_batch[file_hash] = case
+        queued.append((case, f.filename))
+        responses.append(VerifyResponse(
+            case_id=case.id,
+            status="queued",
+            message=f"הניתוח נכנס לתור — סטטוס ב-GET /v1/verify/{case.id}",
+        ))
+
+    await db.commit()   # one transaction for every new case in the batch
+    from app.core.celery_app import run_verification
+    for case, filename in queued:
+        run_verification.delay(str(case.id), filename)
+    return responses
+
+
 @router.get("/verify/{case_id}", response_model=CaseResponse)
 async def get_case_status(case_id: str, db: AsyncSession = Depends(get_db)):
     """קבלת סטטוס ותוצאות בדיקה"""
-    # Basic UUID format check
-    try:
-        uuid.UUID(case_id)
-    except ValueError:
-        raise HTTPException(status_code=400, detail="case_id לא תקין")
+    case_uuid = _parse_case_id(case_id)
 
-    result = await db.execute(select(Case).where(Case.id == case_id))
-    case = result.scalar_one_or_none()
+    case = await db.get(Case, case_uuid, options=[selectinload(Case.agent_results)])
     if not case:
         raise HTTPException(status_code=404, detail="מקרה לא נמצא")
 
-    agents_result = await db.execute(
-        select(AgentResult).where(AgentResult.case_id == case_id)
-    )
-    agent_results = agents_result.scalars().all()
+    agent_results = case.agent_results
 
     agent_responses = []
     red_team_data = None
     for ar in agent_results:
         if ar.agent_type == "red_team":
-            red_team_data = {
-                "summary":      ar.findings.get("summary", "")      if ar.findings  else "",
-                "threat_level": ar.findings.get("threat_level", "low") if ar.findings else "low",
-                "challenges":   ar.anomalies.get("challenges", [])  if ar.anomalies else [],
-                "blind_spots":  ar.anomalies.get("blind_spots", []) if ar.anomalies else [],
-                "recommendations": ar.anomalies.get("recommendations", []) if ar.anomalies else [],
-            }
+            red_team_data = RedTeamResponse(
+                summary=ar.findings.get("summary", "") if ar.findings else "",
+                threat_level=ar.findings.get("threat_level", "low") if ar.findings else "low",
+                challenges=ar.anomalies.get("challenges", []) if ar.anomalies else [],
+                blind_spots=ar.anomalies.get("blind_spots", []) if ar.anomalies else [],
+                recommendations=ar.anomalies.get("recommendations", []) if ar.anomalies else [],
+            )
             continue
         anomalies = [AnomalyDetail(**a) for a in ar.anomalies.get("items", [])] if ar.anomalies else []
         agent_responses.append(AgentResultResponse(
@@ -231,7 +284,7 @@ async def get_case_status(case_id: str, db: AsyncSession = Depends(get_db)):
 
     hitl_rec = "רמת הביטחון מתחת לסף. מומלץ לשלב מומחה אנושי." if case.hitl_required else None
 
-    resp = CaseResponse(
+    return CaseResponse(
         id=case.id,
         status=case.status,
         media_type=case.media_type,
@@ -241,12 +294,9 @@ async def get_case_status(case_id: str, db: AsyncSession = Depends(get_db)):
         hitl_required=case.hitl_required,
         hitl_recommendation=hitl_rec,
         agent_results=agent_responses,
+        red_team=red_team_data,
         created_at=case.created_at,
     )
-    result_dict = resp.model_dump()
-    if red_team_data:
-        result_dict["red_team"] = red_team_data
-    return result_dict
 
 
 @router.post("/verify/{case_id}/hitl")
@@ -256,13 +306,9 @@ async def request_hitl(
     db: AsyncSession = Depends(get_db),
 ):
     """אישור הזמנת מומחה אנושי"""
-    try:
-        uuid.UUID(case_id)
-    except ValueError:
-        raise HTTPException(status_code=400, detail="case_id לא תקין")
+    case_uuid = _parse_case_id(case_id)
 
-    result = await db.execute(select(Case).where(Case.id == case_id))
-    case = result.scalar_one_or_none()
+    case = await db.get(Case, case_uuid)
     if not case:
         raise HTTPException(status_code=404, detail="מקרה לא נמצא")
     if not case.hitl_required:
@@ -274,34 +320,32 @@ async def request_hitl(
 
 
 @router.get("/report/{case_id}")
-async def download_report(case_id: str, db: AsyncSession = Depends(get_db)):
-    """הורדת דוח PDF ראייתי"""
-    from fastapi.responses import Response
-    from app.models.models import CrossReferenceResult
-
-    try:
-        uuid.UUID(case_id)
-    except ValueError:
-        raise HTTPException(status_code=400, detail="case_id לא תקין")
-
-    result = await db.execute(select(Case).where(Case.id == case_id))
-    case = result.scalar_one_or_none()
+async def download_report(case_id: str, draft: bool = False, db: AsyncSession = Depends(get_db)):
+    """הורדת דוח PDF ראייתי (draft=true — תצוגה מקדימה של עמוד אחד, לא נשמרת)"""
+    case_uuid = _parse_case_id(case_id)
+
+    case = await db.get(
+        Case, case_uuid,
+        options=[selectinload(Case.agent_results), selectinload(Case.cross_reference),
+                 selectinload(Case.report)],
+    )
     if not case:
         raise HTTPException(status_code=404, detail="מקרה לא נמצא")
 
-    agents_result = await db.execute(
-        select(AgentResult).where(AgentResult.case_id == case_id)
-    )
+    headers = {"Content-Disposition": f"attachment; filename=VerifyAI_Report_{case_id[:8]}.pdf"}
+
+    # A finished case doesn't change — serve the PDF stored on first download
+    if not draft and case.report is not None and Path(case.report.report_url).is_file():
+        pdf_bytes = await asyncio.to_thread(Path(case.report.report_url).read_bytes)
+        return Response(content=pdf_bytes, media_type="application/pdf", headers=headers)
+
     agent_results = [
         {"agent_type": ar.agent_type, "confidence_score": ar.confidence_score,
          "findings": ar.findings, "anomalies": ar.anomalies}
-        for ar in agents_result.scalars().all()
+        for ar in case.agent_results
     ]
 
-    cr_result = await db.execute(
-        select(CrossReferenceResult).where(CrossReferenceResult.case_id == case_id)
-    )
-    cr = cr_result.scalar_one_or_none()
+    cr = case.cross_reference
 
     rt_data = next((ar for ar in agent_results if ar["agent_type"] == "red_team"), None)
     rt_challenges   = rt_data["anomalies"].get("challenges", [])    if rt_data and rt_data.get("anomalies") else []
@@ -322,19 +366,27 @@ async def download_report(case_id: str, db: AsyncSession = Depends(get_db)):
         "red_team_threat": rt_threat,
     }
 
-    from app.services.report_generator import generate_report
+    from app.services.report_generator import generate_report, LEGAL_DISCLAIMER
     pdf_bytes = generate_report(
-        case_id=case.id,
+        case_id=str(case.id),
         verdict=case.verdict or "inconclusive",
         confidence=case.confidence_score or 0,
         file_hash=case.file_hash,
         media_type=case.media_type,
         agent_results=agent_results,
         cross_reference=cross_ref,
+        draft=draft,
     )
 
-    return Response(
-        content=pdf_bytes,
-        media_type="application/pdf",
-        headers={"Content-Disposition": f"attachment; filename=VerifyAI_Report_{case_id[:8]}.pdf"},
-    )
+    if not draft and case.status in REPORT_CACHEABLE_STATUSES:
+        report_url = await save_report_locally(pdf_bytes, str(case.id))
+        if case.report is None:
+            db.add(Report(case_id=case.id, report_url=report_url, legal_disclaimer=LEGAL_DISCLAIMER))
+        else:
+            case.report.report_url = report_url
+        try:
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()   # a concurrent download stored it first — same content
+
+    return Response(content=pdf_bytes, media_type="application/pdf", headers=headers)
@@ -1,3 +1,4 @@
+import uuid
 from pydantic import BaseModel
 from datetime import datetime
 
@@ -28,8 +29,16 @@ class AgentResultResponse(BaseModel):
     heatmap_url: str | None = None
 
 
+class RedTeamResponse(BaseModel):
+    summary: str = ""
+    threat_level: str = "low"
+    challenges: list[dict] = []
+    blind_spots: list[dict] = []
+    recommendations: list[str] = []
+
+
 class CaseResponse(BaseModel):
-    id: str
+    id: uuid.UUID
     status: str
     media_type: str
     file_hash: str
@@ -38,6 +47,7 @@ class CaseResponse(BaseModel):
     hitl_required: bool
     hitl_recommendation: str | None = None
     agent_results: list[AgentResultResponse] = []
+    red_team: RedTeamResponse | None = None
     created_at: datetime
 
     class Config:
@@ -45,6 +55,6 @@ class CaseResponse(BaseModel):
 
 
 class VerifyResponse(BaseModel):
-    case_id: str
+    case_id: uuid.UUID
     status: str
     message: str
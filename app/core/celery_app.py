@@ -17,4 +17,18 @@ celery_app.conf.update(
     enable_utc=True,
     task_track_started=True,
     task_acks_late=True,
+    # Each prefork child runs one task under its own event loop, so the in-process case
+    # semaphore can't bound the worker — the pool size does (--concurrency overrides it)
+    worker_concurrency=settings.MAX_CONCURRENT_CASES,
 )
+
+
+@celery_app.task(bind=True, max_retries=3, name="verifyai.run_verification")
+def run_verification(self, case_id: str, filename: str):
+    """Analyse a queued case (enqueued by POST /v1/verify when ASYNC_VERIFICATION is on)."""
+    import asyncio
+    from app.services.verification import run_queued_case
+    try:
+        asyncio.run(run_queued_case(case_id, filename))
+    except Exception as exc:
+        raise self.retry(exc=exc, countdown=10)
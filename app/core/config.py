@@ -11,9 +11,25 @@ class Settings(BaseSettings):
         "sqlite+aiosqlite:///./verifyai.db"
     )
 
+    # Connection pool (server databases only — SQLite keeps SQLAlchemy's defaults)
+    DB_POOL_SIZE: int = 20
+    DB_MAX_OVERFLOW: int = 40
+    DB_POOL_RECYCLE: int = 1800  # seconds — below typical proxy idle-kill timeouts
+
     # Redis (optional for Railway)
     REDIS_URL: str = "redis://redis:6379/0"
 
+    # Queue /v1/verify on the Celery worker and return 202 instead of analysing inline.
+    # Needs Redis + a worker sharing the uploads directory (docker-compose); off for single-process deploys.
+    ASYNC_VERIFICATION: bool = False
+
+    # Analyses running at once — per API process (inline), and the Celery pool size per worker
+    MAX_CONCURRENT_CASES: int = 4
+
+    # Agents running at once within one analysis. The largest agent set (image) has 8;
+    # set lower on small hosts so the CPU-bound pixel agents don't contend for the same cores
+    MAX_PARALLEL_AGENTS: int = 8
+
     # AWS
     AWS_ACCESS_KEY_ID: str = ""
     AWS_SECRET_ACCESS_KEY: str = ""
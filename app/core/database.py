@@ -1,10 +1,18 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker, AsyncConnection
 from sqlalchemy.orm import DeclarativeBase
 from app.core.config import get_settings
 
 settings = get_settings()
 
-engine = create_async_engine(settings.DATABASE_URL, echo=False)
+_pool_kwargs = {} if settings.DATABASE_URL.startswith("sqlite") else {
+    "pool_size": settings.DB_POOL_SIZE,
+    "max_overflow": settings.DB_MAX_OVERFLOW,
+    "pool_pre_ping": True,      # drop connections the proxy closed while idle
+    "pool_recycle": settings.DB_POOL_RECYCLE,
+    "pool_use_lifo": True,      # reuse warm connections, let the surplus idle out
+}
+engine = create_async_engine(settings.DATABASE_URL, echo=False, **_pool_kwargs)
 async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 
@@ -15,3 +23,28 @@ class Base(DeclarativeBase):
 async def get_db() -> AsyncSession:
     async with async_session() as session:
         yield session
+
+
+async def upgrade_schema(conn: AsyncConnection) -> None:
+    """
+    In-place upgrades that create_all can't make to existing tables.
+    Idempotent — runs at every startup, after create_all:
+      ix_agent_results_case_agent         (case_id, agent_type) index — every dialect
+      agent_results.findings / anomalies  json → jsonb — PostgreSQL only
+      ix_agent_results_anomalies_gin      GIN index on anomalies — PostgreSQL only
+    """
+    await conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_agent_results_case_agent ON agent_results (case_id, agent_type)"
+    ))
+    if conn.dialect.name != "postgresql":
+        return
+    rows = await conn.execute(text(
+        "SELECT column_name FROM information_schema.columns "
+        "WHERE table_schema = current_schema() AND table_name = 'agent_results' "
+        "AND column_name IN ('findings', 'anomalies') AND data_type = 'json'"
+    ))
+    for (column,) in rows.all():
+        await conn.execute(text(f"ALTER TABLE agent_results ALTER COLUMN {column} TYPE jsonb USING {column}::jsonb"))
+    await conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_agent_results_anomalies_gin ON agent_results USING gin (anomalies)"
+    ))
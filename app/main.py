@@ -1,6 +1,6 @@
 from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from pathlib import Path
@@ -8,8 +8,10 @@ from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 from slowapi.middleware import SlowAPIMiddleware
-from app.core.database import engine, Base
+from app.core.database import engine, Base, upgrade_schema
 from app.api.routes import router
+from app.agents import vision_agents
+from app.services.verification import get_orchestrator
 
 # ── Rate limiter — keyed by IP ────────────────────────────────────────────────
 limiter = Limiter(key_func=get_remote_address, default_limits=["200/day", "60/hour"])
@@ -19,7 +21,11 @@ limiter = Limiter(key_func=get_remote_address, default_limits=["200/day", "60/ho
 async def lifespan(app: FastAPI):
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await upgrade_schema(conn)   # existing tables: indexes, json → jsonb on PostgreSQL
+    get_orchestrator()  # build the agent graph at startup, not on the first upload
     yield
+    await vision_agents.shutdown()
+    await engine.dispose()
 
 
 app = FastAPI(
@@ -27,6 +33,7 @@ app = FastAPI(
     description="Forensic media authentication — multi-agent AI pipeline",
     version="0.2.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 # ── CORS ──────────────────────────────────────────────────────────────────────
@@ -1,14 +1,49 @@
+import os
+import time
 import uuid
 from datetime import datetime
-from sqlalchemy import String, Float, Boolean, DateTime, ForeignKey, Text, JSON
+from sqlalchemy import String, Float, Boolean, DateTime, ForeignKey, Text, JSON, Index
+from sqlalchemy.types import TypeDecorator
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.core.database import Base
 
+def uuid7() -> uuid.UUID:
+    """
+    Time-ordered UUID (RFC 9562 v7): 48-bit Unix ms timestamp, then random bits.
+    New rows land on the rightmost B-tree leaf instead of a random page.
+    """
+    value = (time.time_ns() // 1_000_000) << 80 | int.from_bytes(os.urandom(10), "big")
+    value = value & ~(0xF << 76) | 0x7 << 76          # version 7
+    value = value & ~(0x3 << 62) | 0x2 << 62          # RFC 4122 variant
+    return uuid.UUID(int=value)
+
+
+class UUIDString(TypeDecorator):
+    """
+    uuid.UUID in Python, stored as the hyphenated 36-char string the keys have always used.
+    Existing rows keep matching; switch to the native Uuid type only together with a data migration.
+    """
+    impl = String(36)
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return str(value if isinstance(value, uuid.UUID) else uuid.UUID(str(value)))
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else uuid.UUID(value)
+
+
+# JSON payloads are binary JSONB on PostgreSQL (parsed once on write, GIN-indexable), plain JSON elsewhere.
+JSONType = JSON().with_variant(JSONB(), "postgresql")
+
 
 class Case(Base):
     __tablename__ = "cases"
 
-    id: Mapped[str] = mapped_column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id: Mapped[uuid.UUID] = mapped_column(UUIDString, primary_key=True, default=uuid7)
     client_id: Mapped[str] = mapped_column(String(36), index=True)
     status: Mapped[str] = mapped_column(String(20), default="pending")  # pending, processing, completed, hitl_required
     media_type: Mapped[str] = mapped_column(String(20))  # image, video, audio, document
@@ -28,12 +63,18 @@ class Case(Base):
 
 class AgentResult(Base):
     __tablename__ = "agent_results"
-
-    id: Mapped[str] = mapped_column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    case_id: Mapped[str] = mapped_column(String(36), ForeignKey("cases.id"), index=True)
+    __table_args__ = (
+        # (case_id, agent_type) — serves per-case loads and the red_team row; case_id alone is its prefix
+        Index("ix_agent_results_case_agent", "case_id", "agent_type"),
+        # containment / key queries into anomalies — PostgreSQL only
+        Index("ix_agent_results_anomalies_gin", "anomalies", postgresql_using="gin").ddl_if(dialect="postgresql"),
+    )
+
+    id: Mapped[uuid.UUID] = mapped_column(UUIDString, primary_key=True, default=uuid7)
+    case_id: Mapped[uuid.UUID] = mapped_column(UUIDString, ForeignKey("cases.id"))
     agent_type: Mapped[str] = mapped_column(String(50))  # forensic_technical, physical, contextual, etc.
-    findings: Mapped[dict] = mapped_column(JSON, default=dict)
-    anomalies: Mapped[dict] = mapped_column(JSON, default=dict)
+    findings: Mapped[dict] = mapped_column(JSONType, default=dict)
+    anomalies: Mapped[dict] = mapped_column(JSONType, default=dict)
     confidence_score: Mapped[float] = mapped_column(Float)
     heatmap_url: Mapped[str | None] = mapped_column(String(500), nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
@@ -44,8 +85,8 @@ class AgentResult(Base):
 class CrossReferenceResult(Base):
     __tablename__ = "cross_reference_results"
 
-    id: Mapped[str] = mapped_column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    case_id: Mapped[str] = mapped_column(String(36), ForeignKey("cases.id"), unique=True)
+    id: Mapped[uuid.UUID] = mapped_column(UUIDString, primary_key=True, default=uuid7)
+    case_id: Mapped[uuid.UUID] = mapped_column(UUIDString, ForeignKey("cases.id"), unique=True)
     combined_score: Mapped[float] = mapped_column(Float)
     reasoning: Mapped[str] = mapped_column(Text)
     final_verdict: Mapped[str] = mapped_column(String(20))
@@ -57,9 +98,9 @@ class CrossReferenceResult(Base):
 class HITLReview(Base):
     __tablename__ = "hitl_reviews"
 
-    id: Mapped[str] = mapped_column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    case_id: Mapped[str] = mapped_column(String(36), ForeignKey("cases.id"), unique=True)
-    expert_id: Mapped[str] = mapped_column(String(36), ForeignKey("experts.id"))
+    id: Mapped[uuid.UUID] = mapped_column(UUIDString, primary_key=True, default=uuid7)
+    case_id: Mapped[uuid.UUID] = mapped_column(UUIDString, ForeignKey("cases.id"), unique=True)
+    expert_id: Mapped[uuid.UUID] = mapped_column(UUIDString, ForeignKey("experts.id"))
     expert_verdict: Mapped[str | None] = mapped_column(String(20), nullable=True)
     notes: Mapped[str | None] = mapped_column(Text, nullable=True)
     completed_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
@@ -72,7 +113,7 @@ class HITLReview(Base):
 class Expert(Base):
     __tablename__ = "experts"
 
-    id: Mapped[str] = mapped_column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id: Mapped[uuid.UUID] = mapped_column(UUIDString, primary_key=True, default=uuid7)
     name: Mapped[str] = mapped_column(String(100))
     email: Mapped[str] = mapped_column(String(200))
     domain: Mapped[str] = mapped_column(String(50))  # insurance, history, forensics
@@ -83,8 +124,8 @@ class Expert(Base):
 class Report(Base):
     __tablename__ = "reports"
 
-    id: Mapped[str] = mapped_column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    case_id: Mapped[str] = mapped_column(String(36), ForeignKey("cases.id"), unique=True)
+    id: Mapped[uuid.UUID] = mapped_column(UUIDString, primary_key=True, default=uuid7)
+    case_id: Mapped[uuid.UUID] = mapped_column(UUIDString, ForeignKey("cases.id"), unique=True)
     report_url: Mapped[str] = mapped_column(String(500))
     format: Mapped[str] = mapped_column(String(10), default="pdf")
     legal_disclaimer: Mapped[str] = mapped_column(Text)
@@ -96,7 +137,7 @@ class Report(Base):
 class RedTeamTest(Base):
     __tablename__ = "red_team_tests"
 
-    id: Mapped[str] = mapped_column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id: Mapped[uuid.UUID] = mapped_column(UUIDString, primary_key=True, default=uuid7)
     injected_file_url: Mapped[str] = mapped_column(String(500))
     expected_result: Mapped[str] = mapped_column(String(20))
     actual_result: Mapped[str | None] = mapped_column(String(20), nullable=True)
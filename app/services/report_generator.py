@@ -4,7 +4,9 @@
 """
 import io
 import hashlib
-from datetime import datetime
+from collections import Counter
+from datetime import datetime, timezone
+from functools import lru_cache
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import mm, cm
 from reportlab.lib.colors import HexColor
@@ -35,9 +37,127 @@ WHITE = HexColor("#ffffff")
 BG_LIGHT = HexColor("#f5f7fb")
 BORDER = HexColor("#dde2ee")
 
+LEGAL_DISCLAIMER = (
+    "LEGAL DISCLAIMER: This report is generated by VerifyAI automated multi-agent forensic analysis system. "
+    "Results are based on algorithmic analysis and do not constitute legal opinion, admissible evidence in court proceedings, "
+    "or a substitute for professional examination by a certified expert. Chain of custody is documented via SHA-256 hash "
+    "from the moment of file ingestion. The cryptographic stamp certifies that this analysis was performed — it does not "
+    "certify authenticity of the analyzed media. For cases requiring legal certainty, engagement of a certified HITL expert "
+    "is recommended. VerifyAI assumes no liability for decisions made based on this report."
+)
+
+
+VERDICT_LABELS = {
+    "authentic": "AUTHENTIC — No signs of forgery detected",
+    "forged": "FORGERY DETECTED — High confidence",
+    "inconclusive": "INCONCLUSIVE — Further review required",
+}
+VERDICT_STYLE_KEYS = {"authentic": "verdict_auth", "forged": "verdict_forged", "inconclusive": "verdict_inc"}
+VERDICT_BOX_COLOR = {"authentic": HexColor("#e8f5e9"), "forged": HexColor("#fce4ec"), "inconclusive": HexColor("#fff8e1")}
+VERDICT_BORDER = {"authentic": GREEN, "forged": RED, "inconclusive": AMBER}
+
+AGENT_NAMES = {
+    "forensic_technical": "Forensic-Technical Agent",
+    "physical": "Physical Agent",
+    "contextual": "Contextual Agent",
+    "ai_generation": "AI Generation Detection Agent",
+    "copy_move": "Copy-Move Detection Agent",
+    "frequency_analysis": "Frequency Analysis Agent",
+    "audio_deepfake": "Audio Deepfake Detection Agent",
+    "video_forensic": "Video Forensic Agent",
+    "document_forensic": "Document Forensic Agent",
+    "metadata_consistency": "Metadata Consistency Agent",
+}
+AGENT_DESCS = {
+    "forensic_technical": "ELA, EXIF metadata, compression analysis, grain analysis",
+    "physical": "Shadow direction, lighting, perspective, reflections",
+    "contextual": "Historical context, uniforms, technology, architecture, vegetation",
+    "ai_generation": "AI-generated content detection (DALL-E, Midjourney, Stable Diffusion)",
+    "copy_move": "Clone region detection via block-matching and DCT features",
+    "frequency_analysis": "DCT spectral analysis, JPEG grid consistency, noise uniformity",
+    "audio_deepfake": "Spectral analysis, TTS detection, voice cloning artifacts",
+    "video_forensic": "Frame extraction, temporal consistency, scene cut detection",
+    "document_forensic": "Metadata, font analysis, digital signatures, structure checks",
+    "metadata_consistency": "EXIF cross-check, GPS vs timezone, camera vs resolution, dates, ICC profiles",
+}
+
+
+# Requester rows — (label, key) per requester type
+_PERSON_FIELDS = (("Name", "name"), ("ID Type", "id_type"), ("ID Number", "id_number"), ("Email", "email"), ("Phone", "phone"))
+_COMPANY_FIELDS = (
+    ("Company", "company"), ("Entity Type", "entity_type"), ("Registration #", "reg_number"),
+    ("Contact", "contact"), ("Email", "email"), ("Phone", "phone"),
+)
 
+# Table styles — data-independent, built once (setStyle only reads the commands)
+_REQ_TABLE_STYLE = TableStyle([
+    ("FONTNAME", (0, 0), (0, -1), "Helvetica-Bold"),
+    ("FONTNAME", (1, 0), (1, -1), "Helvetica"),
+    ("FONTSIZE", (0, 0), (-1, -1), 9),
+    ("TEXTCOLOR", (0, 0), (0, -1), TEXT2),
+    ("TEXTCOLOR", (1, 0), (1, -1), TEXT),
+    ("BOTTOMPADDING", (0, 0), (-1, -1), 4),
+    ("TOPPADDING", (0, 0), (-1, -1), 4),
+    ("LINEBELOW", (0, 0), (-1, -2), 0.5, BORDER),
+])
+_FILE_TABLE_STYLE = TableStyle([
+    ("FONTNAME", (0, 0), (0, -1), "Helvetica-Bold"),
+    ("FONTNAME", (1, 0), (1, -1), "Courier"),
+    ("FONTSIZE", (0, 0), (-1, -1), 9),
+    ("TEXTCOLOR", (0, 0), (0, -1), TEXT2),
+    ("TEXTCOLOR", (1, 0), (1, -1), TEXT),
+    ("BOTTOMPADDING", (0, 0), (-1, -1), 4),
+    ("TOPPADDING", (0, 0), (-1, -1), 4),
+    ("LINEBELOW", (0, 0), (-1, -2), 0.5, BORDER),
+])
+_ANOM_TABLE_STYLE = TableStyle([
+    ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+    ("FONTNAME", (0, 1), (-1, -1), "Helvetica"),
+    ("FONTSIZE", (0, 0), (-1, -1), 8),
+    ("BACKGROUND", (0, 0), (-1, 0), BLUE),
+    ("TEXTCOLOR", (0, 0), (-1, 0), WHITE),
+    ("TEXTCOLOR", (0, 1), (-1, -1), TEXT),
+    ("ROWBACKGROUNDS", (0, 1), (-1, -1), [WHITE, BG_LIGHT]),
+    ("BOTTOMPADDING", (0, 0), (-1, -1), 5),
+    ("TOPPADDING", (0, 0), (-1, -1), 5),
+    ("LINEBELOW", (0, 0), (-1, -1), 0.5, BORDER),
+    ("BOX", (0, 0), (-1, -1), 0.5, BORDER),
+    ("VALIGN", (0, 0), (-1, -1), "TOP"),
+])
+_CR_TABLE_STYLE = TableStyle([
+    ("FONTNAME", (0, 0), (0, -1), "Helvetica-Bold"),
+    ("FONTNAME", (1, 0), (1, -1), "Courier"),
+    ("FONTSIZE", (0, 0), (-1, -1), 9),
+    ("TEXTCOLOR", (0, 0), (0, -1), TEXT2),
+    ("BOTTOMPADDING", (0, 0), (-1, -1), 4),
+    ("TOPPADDING", (0, 0), (-1, -1), 4),
+    ("LINEBELOW", (0, 0), (-1, -2), 0.5, BORDER),
+])
+_BAR_TABLE_STYLE = TableStyle([
+    ("FONTNAME", (0, 0), (-1, -1), "Helvetica"),
+    ("FONTSIZE", (0, 0), (-1, -1), 9),
+    ("BOTTOMPADDING", (0, 0), (-1, -1), 6),
+    ("TOPPADDING", (0, 0), (-1, -1), 6),
+    ("LINEBELOW", (0, 0), (-1, -1), 0.5, BORDER),
+    ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+])
+_STAMP_TABLE_STYLE = TableStyle([
+    ("FONTNAME", (0, 0), (0, -1), "Helvetica-Bold"),
+    ("FONTNAME", (1, 0), (1, -1), "Courier"),
+    ("FONTSIZE", (0, 0), (-1, -1), 8),
+    ("TEXTCOLOR", (0, 0), (0, -1), TEXT2),
+    ("TEXTCOLOR", (1, 0), (1, -1), TEXT),
+    ("BACKGROUND", (0, 0), (-1, -1), BG_LIGHT),
+    ("BOX", (0, 0), (-1, -1), 1, BLUE),
+    ("BOTTOMPADDING", (0, 0), (-1, -1), 5),
+    ("TOPPADDING", (0, 0), (-1, -1), 5),
+    ("LINEBELOW", (0, 0), (-1, -2), 0.5, BORDER),
+])
+
+
+@lru_cache()
 def _styles():
-    """סגנונות טקסט לדוח."""
+    """סגנונות טקסט לדוח — נבנים פעם אחת לתהליך (ParagraphStyle אינו משתנה בזמן build)."""
     return {
         "title": ParagraphStyle("title", fontName="Helvetica-Bold", fontSize=22, leading=28, alignment=TA_LEFT, textColor=TEXT),
         "subtitle": ParagraphStyle("subtitle", fontName="Helvetica", fontSize=11, leading=16, textColor=TEXT2),
@@ -55,210 +175,85 @@ def _styles():
     }
 
 
-def generate_report(
-    case_id: str,
-    verdict: str,
-    confidence: float,
-    file_hash: str,
-    media_type: str,
-    agent_results: list,
-    cross_reference: dict,
-    requester: dict = None,
-) -> bytes:
-    """יוצר דוח PDF ומחזיר bytes."""
+@lru_cache(maxsize=512)
+def _para_frags(text: str, style_name: str) -> list:
+    """Parsed markup of a fixed text (headings, agent names/descriptions, disclaimer)."""
+    return Paragraph(text, _styles()[style_name]).frags
 
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(
-        buffer, pagesize=A4,
-        leftMargin=20*mm, rightMargin=20*mm,
-        topMargin=25*mm, bottomMargin=20*mm,
-    )
 
-    s = _styles()
-    story = []
-    now = datetime.utcnow()
+def _para(text: str, style_name: str) -> Paragraph:
+    """
+    Paragraph for repeated text — the markup is parsed once per process.
+    A fresh flowable every call: reportlab keeps layout state on the Paragraph during build.
+    """
+    return Paragraph(text, _styles()[style_name], frags=_para_frags(text, style_name))
 
-    # ─── HEADER ───
-    story.append(Paragraph("VerifyAI — Forensic Analysis Report", s["title"]))
-    story.append(Spacer(1, 4))
-    story.append(HRFlowable(width="100%", thickness=2, color=BLUE, spaceAfter=8))
-    story.append(Paragraph(
-        f"Case ID: {case_id}  |  Generated: {now.strftime('%Y-%m-%d %H:%M:%S UTC')}  |  Classification: CONFIDENTIAL",
-        s["mono"]
-    ))
-    story.append(Spacer(1, 16))
 
-    # ─── REQUESTER INFO ───
-    if requester:
-        story.append(Paragraph("Requester Information", s["h2"]))
-        req_data = []
-        if requester.get("type") == "person":
-            req_data = [
-                ["Name", requester.get("name", "N/A")],
-                ["ID Type", "Teudat Zehut" if requester.get("id_type") == "id" else "Passport"],
-                ["ID Number", requester.get("id_number", "N/A")],
-                ["Email", requester.get("email", "N/A")],
-                ["Phone", requester.get("phone", "N/A")],
-            ]
-        else:
-            req_data = [
-                ["Company", requester.get("company", "N/A")],
-                ["Entity Type", requester.get("entity_type", "N/A")],
-                ["Registration #", requester.get("reg_number", "N/A")],
-                ["Contact", requester.get("contact", "N/A")],
-                ["Email", requester.get("email", "N/A")],
-                ["Phone", requester.get("phone", "N/A")],
-            ]
-
-        req_table = Table(req_data, colWidths=[40*mm, 120*mm])
-        req_table.setStyle(TableStyle([
-            ("FONTNAME", (0, 0), (0, -1), "Helvetica-Bold"),
-            ("FONTNAME", (1, 0), (1, -1), "Helvetica"),
-            ("FONTSIZE", (0, 0), (-1, -1), 9),
-            ("TEXTCOLOR", (0, 0), (0, -1), TEXT2),
-            ("TEXTCOLOR", (1, 0), (1, -1), TEXT),
-            ("BOTTOMPADDING", (0, 0), (-1, -1), 4),
-            ("TOPPADDING", (0, 0), (-1, -1), 4),
-            ("LINEBELOW", (0, 0), (-1, -2), 0.5, BORDER),
-        ]))
-        story.append(req_table)
-        story.append(Spacer(1, 16))
-
-    # ─── VERDICT ───
-    story.append(Paragraph("Analysis Verdict", s["h2"]))
+def _anomaly_summary(agent_results: list) -> dict:
+    """Severity counts over all agents — for callers that don't pass anomaly_summary (e.g. stored cases)."""
+    sev = Counter(
+        str(item.get("severity", "")).lower()
+        for ar in agent_results
+        for item in _anomaly_items(ar)
+    )
+    return {"total": sum(sev.values()), "high": sev["high"], "medium": sev["medium"], "low": sev["low"]}
 
-    verdict_labels = {
-        "authentic": "AUTHENTIC — No signs of forgery detected",
-        "forged": "FORGERY DETECTED — High confidence",
-        "inconclusive": "INCONCLUSIVE — Further review required",
-    }
-    verdict_style = {
-        "authentic": s["verdict_auth"],
-        "forged": s["verdict_forged"],
-        "inconclusive": s["verdict_inc"],
-    }
 
-    verdict_box_color = {"authentic": HexColor("#e8f5e9"), "forged": HexColor("#fce4ec"), "inconclusive": HexColor("#fff8e1")}
-    verdict_border = {"authentic": GREEN, "forged": RED, "inconclusive": AMBER}
+def _anomaly_items(ar: dict) -> list:
+    anomalies = ar.get("anomalies") or {}
+    return anomalies.get("items", []) if isinstance(anomalies, dict) else anomalies
 
-    vt = Table(
-        [[Paragraph(verdict_labels.get(verdict, verdict.upper()), verdict_style.get(verdict, s["body"]))]],
-        colWidths=[160*mm],
-    )
-    vt.setStyle(TableStyle([
-        ("BACKGROUND", (0, 0), (-1, -1), verdict_box_color.get(verdict, BG_LIGHT)),
-        ("ALIGN", (0, 0), (-1, -1), "CENTER"),
-        ("TOPPADDING", (0, 0), (-1, -1), 14),
-        ("BOTTOMPADDING", (0, 0), (-1, -1), 14),
-        ("BOX", (0, 0), (-1, -1), 1.5, verdict_border.get(verdict, BORDER)),
-        ("ROUNDEDCORNERS", [6, 6, 6, 6]),
-    ]))
-    story.append(vt)
-    story.append(Spacer(1, 6))
-    story.append(Paragraph(f"Confidence Score: {confidence:.1%}", s["center"]))
-    story.append(Spacer(1, 16))
 
+def _detail_sections(story: list, s: dict, file_hash: str, media_type: str, now_str: str,
+                     agent_results: list, cross_reference: dict) -> None:
+    """File info, per-agent findings, cross-reference, confidence chart and red team — omitted from drafts."""
     # ─── FILE INFO ───
-    story.append(Paragraph("File Information", s["h2"]))
     file_data = [
         ["SHA-256 Hash", file_hash or "N/A"],
         ["Media Type", media_type],
-        ["Analysis Date", now.strftime("%Y-%m-%d %H:%M:%S UTC")],
+        ["Analysis Date", now_str],
         ["Agents Deployed", str(len(agent_results))],
     ]
     ft = Table(file_data, colWidths=[40*mm, 120*mm])
-    ft.setStyle(TableStyle([
-        ("FONTNAME", (0, 0), (0, -1), "Helvetica-Bold"),
-        ("FONTNAME", (1, 0), (1, -1), "Courier"),
-        ("FONTSIZE", (0, 0), (-1, -1), 9),
-        ("TEXTCOLOR", (0, 0), (0, -1), TEXT2),
-        ("TEXTCOLOR", (1, 0), (1, -1), TEXT),
-        ("BOTTOMPADDING", (0, 0), (-1, -1), 4),
-        ("TOPPADDING", (0, 0), (-1, -1), 4),
-        ("LINEBELOW", (0, 0), (-1, -2), 0.5, BORDER),
-    ]))
-    story.append(ft)
-    story.append(Spacer(1, 16))
+    ft.setStyle(_FILE_TABLE_STYLE)
+    story.append(KeepTogether([_para("File Information", "h2"), ft, Spacer(1, 16)]))
 
     # ─── AGENT RESULTS ───
-    story.append(Paragraph("Agent Analysis Details", s["h2"]))
-
-    agent_names = {
-        "forensic_technical": "Forensic-Technical Agent",
-        "physical": "Physical Agent",
-        "contextual": "Contextual Agent",
-        "ai_generation": "AI Generation Detection Agent",
-        "copy_move": "Copy-Move Detection Agent",
-        "frequency_analysis": "Frequency Analysis Agent",
-        "audio_deepfake": "Audio Deepfake Detection Agent",
-        "video_forensic": "Video Forensic Agent",
-        "document_forensic": "Document Forensic Agent",
-        "metadata_consistency": "Metadata Consistency Agent",
-    }
-    agent_descs = {
-        "forensic_technical": "ELA, EXIF metadata, compression analysis, grain analysis",
-        "physical": "Shadow direction, lighting, perspective, reflections",
-        "contextual": "Historical context, uniforms, technology, architecture, vegetation",
-        "ai_generation": "AI-generated content detection (DALL-E, Midjourney, Stable Diffusion)",
-        "copy_move": "Clone region detection via block-matching and DCT features",
-        "frequency_analysis": "DCT spectral analysis, JPEG grid consistency, noise uniformity",
-        "audio_deepfake": "Spectral analysis, TTS detection, voice cloning artifacts",
-        "video_forensic": "Frame extraction, temporal consistency, scene cut detection",
-        "document_forensic": "Metadata, font analysis, digital signatures, structure checks",
-        "metadata_consistency": "EXIF cross-check, GPS vs timezone, camera vs resolution, dates, ICC profiles",
-    }
+    story.append(_para("Agent Analysis Details", "h2"))
 
     for ar in agent_results:
         atype = ar.get("agent_type", "unknown")
-        aname = agent_names.get(atype, atype)
-        adesc = agent_descs.get(atype, "")
+        aname = AGENT_NAMES.get(atype, atype)
+        adesc = AGENT_DESCS.get(atype, "")
         ascore = ar.get("confidence_score", 0)
 
-        story.append(Paragraph(f"{aname}", s["h3"]))
-        story.append(Paragraph(f"{adesc}", s["body_small"]))
-        story.append(Paragraph(f"Confidence: {ascore:.0%}", s["body_small"]))
-        story.append(Spacer(1, 4))
+        block = [
+            _para(aname, "h3"),
+            _para(adesc, "body_small"),
+            Paragraph(f"Confidence: {ascore:.0%}", s["body_small"]),
+            Spacer(1, 4),
+        ]
 
-        anomalies = ar.get("anomalies", {})
-        items = anomalies.get("items", []) if isinstance(anomalies, dict) else anomalies
+        items = _anomaly_items(ar)
         if items:
-            anom_data = [["#", "Type", "Severity", "Description"]]
-            for i, item in enumerate(items):
-                anom_data.append([
-                    str(i + 1),
-                    item.get("type", "N/A"),
-                    item.get("severity", "N/A").upper(),
-                    item.get("description", "")[:120],
-                ])
+            anom_data = [["#", "Type", "Severity", "Description"]] + [
+                [str(i), item.get("type", "N/A"), item.get("severity", "N/A").upper(), item.get("description", "")[:120]]
+                for i, item in enumerate(items, 1)
+            ]
 
             at = Table(anom_data, colWidths=[8*mm, 25*mm, 20*mm, 107*mm])
-            at.setStyle(TableStyle([
-                ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-                ("FONTNAME", (0, 1), (-1, -1), "Helvetica"),
-                ("FONTSIZE", (0, 0), (-1, -1), 8),
-                ("BACKGROUND", (0, 0), (-1, 0), BLUE),
-                ("TEXTCOLOR", (0, 0), (-1, 0), WHITE),
-                ("TEXTCOLOR", (0, 1), (-1, -1), TEXT),
-                ("ROWBACKGROUNDS", (0, 1), (-1, -1), [WHITE, BG_LIGHT]),
-                ("BOTTOMPADDING", (0, 0), (-1, -1), 5),
-                ("TOPPADDING", (0, 0), (-1, -1), 5),
-                ("LINEBELOW", (0, 0), (-1, -1), 0.5, BORDER),
-                ("BOX", (0, 0), (-1, -1), 0.5, BORDER),
-                ("VALIGN", (0, 0), (-1, -1), "TOP"),
-            ]))
-            story.append(at)
+            at.setStyle(_ANOM_TABLE_STYLE)
+            block.append(at)
         else:
-            story.append(Paragraph("No anomalies detected by this agent.", s["body_small"]))
+            block.append(_para("No anomalies detected by this agent.", "body_small"))
 
-        story.append(Spacer(1, 10))
+        block.append(Spacer(1, 10))
+        # Agent heading stays on the page with its table
+        story.append(KeepTogether(block))
 
     # ─── CROSS-REFERENCE ───
-    story.append(Paragraph("Cross-Reference Analysis", s["h2"]))
     reasoning = cross_reference.get("reasoning", "N/A")
-    story.append(Paragraph(reasoning, s["body"]))
-    story.append(Spacer(1, 8))
-
-    anom_sum = cross_reference.get("anomaly_summary", {})
+    anom_sum = cross_reference.get("anomaly_summary") or _anomaly_summary(agent_results)
     cr_data = [
         ["Combined Score", f"{cross_reference.get('combined_score', 0):.1%}"],
         ["Total Anomalies", str(anom_sum.get("total", 0))],
@@ -268,25 +263,16 @@ def generate_report(
         ["Final Verdict", cross_reference.get("final_verdict", "N/A").upper()],
     ]
     ct = Table(cr_data, colWidths=[40*mm, 120*mm])
-    ct.setStyle(TableStyle([
-        ("FONTNAME", (0, 0), (0, -1), "Helvetica-Bold"),
-        ("FONTNAME", (1, 0), (1, -1), "Courier"),
-        ("FONTSIZE", (0, 0), (-1, -1), 9),
-        ("TEXTCOLOR", (0, 0), (0, -1), TEXT2),
-        ("BOTTOMPADDING", (0, 0), (-1, -1), 4),
-        ("TOPPADDING", (0, 0), (-1, -1), 4),
-        ("LINEBELOW", (0, 0), (-1, -2), 0.5, BORDER),
+    ct.setStyle(_CR_TABLE_STYLE)
+    story.append(KeepTogether([
+        _para("Cross-Reference Analysis", "h2"), Paragraph(reasoning, s["body"]), Spacer(1, 8), ct, Spacer(1, 16),
     ]))
-    story.append(ct)
-    story.append(Spacer(1, 16))
-
-    # ─── AGENT CONFIDENCE CHART (horizontal bars) ───
-    story.append(Paragraph("Agent Confidence Overview", s["h2"]))
 
+    # ─── AGENT CONFIDENCE CHART (horizontal bars) — omitted when no agent ran ───
     chart_data = []
     for ar in agent_results:
         atype = ar.get("agent_type", "unknown")
-        aname = agent_names.get(atype, atype)
+        aname = AGENT_NAMES.get(atype, atype)
         ascore = ar.get("confidence_score", 0)
         bar_color = GREEN if ascore >= 0.8 else AMBER if ascore >= 0.6 else RED
         chart_data.append([aname, ascore, bar_color])
@@ -296,30 +282,22 @@ def generate_report(
         for name, score, color in chart_data:
             # Create a visual bar using a colored table cell
             bar_rows.append([
-                Paragraph(name, s["body_small"]),
+                _para(name, "body_small"),
                 Paragraph(f"{score:.0%}", s["mono"]),
             ])
 
         bar_table = Table(bar_rows, colWidths=[55*mm, 105*mm])
-        bar_table.setStyle(TableStyle([
-            ("FONTNAME", (0, 0), (-1, -1), "Helvetica"),
-            ("FONTSIZE", (0, 0), (-1, -1), 9),
-            ("BOTTOMPADDING", (0, 0), (-1, -1), 6),
-            ("TOPPADDING", (0, 0), (-1, -1), 6),
-            ("LINEBELOW", (0, 0), (-1, -1), 0.5, BORDER),
-            ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-        ]))
+        bar_table.setStyle(_BAR_TABLE_STYLE)
         # Add colored backgrounds based on score
         for i, (name, score, color) in enumerate(chart_data):
             bar_table.setStyle(TableStyle([
                 ("TEXTCOLOR", (1, i), (1, i), color),
                 ("FONTNAME", (1, i), (1, i), "Courier-Bold"),
             ]))
-        story.append(bar_table)
-    story.append(Spacer(1, 16))
+        story.append(KeepTogether([_para("Agent Confidence Overview", "h2"), bar_table, Spacer(1, 16)]))
 
     # ─── RED TEAM ANALYSIS ───
-    story.append(Paragraph("Red Team Adversarial Report", s["h2"]))
+    story.append(_para("Red Team Adversarial Report", "h2"))
 
     # Red team data may come from cross_reference or separately
     rt_challenges = cross_reference.get("red_team_challenges", [])
@@ -347,64 +325,117 @@ def generate_report(
             story.append(Spacer(1, 6))
 
         if rt_recs:
-            story.append(Paragraph("Recommendations:", s["body_small"]))
+            story.append(_para("Recommendations:", "body_small"))
             for rec in rt_recs[:5]:
                 story.append(Paragraph(f"  > {rec[:150]}", s["body_small"]))
     else:
-        story.append(Paragraph("Red Team analysis data not available for this report. "
-                              "Red Team adversarial validation runs on every analysis to challenge findings, "
-                              "identify blind spots, and recommend improvements.", s["body_small"]))
+        story.append(_para("Red Team analysis data not available for this report. "
+                           "Red Team adversarial validation runs on every analysis to challenge findings, "
+                           "identify blind spots, and recommend improvements.", "body_small"))
 
     story.append(Spacer(1, 16))
 
-    # ─── CRYPTOGRAPHIC STAMP ───
-    story.append(Paragraph("Cryptographic Verification Stamp", s["h2"]))
 
-    stamp_raw = f"CASE:{case_id}|VERDICT:{verdict}|CONF:{confidence}|HASH:{file_hash}|DATE:{now.isoformat()}|AGENTS:{len(agent_results)}"
-    signature = hashlib.sha256(stamp_raw.encode()).hexdigest()
+def generate_report(
+    case_id: str,
+    verdict: str,
+    confidence: float,
+    file_hash: str,
+    media_type: str,
+    agent_results: list,
+    cross_reference: dict,
+    requester: dict = None,
+    draft: bool = False,
+) -> bytes:
+    """
+    יוצר דוח PDF ומחזיר bytes.
+    draft=True — עמוד תצוגה מקדימה בלבד: כותרת, פסיקה וחותמת, בלי פירוט הסוכנים.
+    """
+
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(
+        buffer, pagesize=A4,
+        leftMargin=20*mm, rightMargin=20*mm,
+        topMargin=25*mm, bottomMargin=20*mm,
+    )
+
+    s = _styles()
+    story = []
+    now = datetime.now(timezone.utc)
+    now_str = now.strftime("%Y-%m-%d %H:%M:%S UTC")
+    now_iso = now.isoformat()
+
+    # ─── HEADER ───
+    story.append(_para("VerifyAI — Forensic Analysis Report", "title"))
+    story.append(Spacer(1, 4))
+    story.append(HRFlowable(width="100%", thickness=2, color=BLUE, spaceAfter=8))
+    story.append(Paragraph(
+        f"Case ID: {case_id}  |  Generated: {now_str}  |  Classification: CONFIDENTIAL",
+        s["mono"]
+    ))
+    story.append(Spacer(1, 16))
+
+    # ─── REQUESTER INFO ───
+    fields = _PERSON_FIELDS if requester and requester.get("type") == "person" else _COMPANY_FIELDS
+    if requester and not draft and any(requester.get(key) for _, key in fields):
+        req_data = [
+            [label, ("Teudat Zehut" if requester.get(key) == "id" else "Passport") if key == "id_type" else requester.get(key, "N/A")]
+            for label, key in fields
+        ]
+
+        req_table = Table(req_data, colWidths=[40*mm, 120*mm])
+        req_table.setStyle(_REQ_TABLE_STYLE)
+        story.append(KeepTogether([_para("Requester Information", "h2"), req_table, Spacer(1, 16)]))
+
+    # ─── VERDICT ───
+    vt = Table(
+        [[_para(VERDICT_LABELS.get(verdict, verdict.upper()), VERDICT_STYLE_KEYS.get(verdict, "body"))]],
+        colWidths=[160*mm],
+    )
+    vt.setStyle(TableStyle([
+        ("BACKGROUND", (0, 0), (-1, -1), VERDICT_BOX_COLOR.get(verdict, BG_LIGHT)),
+        ("ALIGN", (0, 0), (-1, -1), "CENTER"),
+        ("TOPPADDING", (0, 0), (-1, -1), 14),
+        ("BOTTOMPADDING", (0, 0), (-1, -1), 14),
+        ("BOX", (0, 0), (-1, -1), 1.5, VERDICT_BORDER.get(verdict, BORDER)),
+        ("ROUNDEDCORNERS", [6, 6, 6, 6]),
+    ]))
+    story.append(KeepTogether([
+        _para("Analysis Verdict", "h2"), vt, Spacer(1, 6),
+        Paragraph(f"Confidence Score: {confidence:.1%}", s["center"]), Spacer(1, 16),
+    ]))
+
+    if not draft:
+        _detail_sections(story, s, file_hash, media_type, now_str, agent_results, cross_reference)
+
+    # ─── CRYPTOGRAPHIC STAMP ───
+    # Payload built straight as bytes — same content as the old f-string, no str → encode round-trip
+    stamp_raw = b"CASE:%s|VERDICT:%s|CONF:%a|HASH:%s|DATE:%s|AGENTS:%d" % (
+        case_id.encode(), verdict.encode(), confidence, str(file_hash).encode(), now_iso.encode(), len(agent_results),
+    )
+    signature = hashlib.sha256(stamp_raw).hexdigest()
 
     stamp_data = [
         ["Case ID", case_id],
-        ["Timestamp", now.strftime("%Y-%m-%d %H:%M:%S UTC")],
+        ["Timestamp", now_str],
         ["File SHA-256", file_hash or "N/A"],
         ["Verdict", verdict.upper()],
         ["Confidence", f"{confidence:.1%}"],
         ["Signature", signature],
     ]
     st = Table(stamp_data, colWidths=[35*mm, 125*mm])
-    st.setStyle(TableStyle([
-        ("FONTNAME", (0, 0), (0, -1), "Helvetica-Bold"),
-        ("FONTNAME", (1, 0), (1, -1), "Courier"),
-        ("FONTSIZE", (0, 0), (-1, -1), 8),
-        ("TEXTCOLOR", (0, 0), (0, -1), TEXT2),
-        ("TEXTCOLOR", (1, 0), (1, -1), TEXT),
-        ("BACKGROUND", (0, 0), (-1, -1), BG_LIGHT),
-        ("BOX", (0, 0), (-1, -1), 1, BLUE),
-        ("BOTTOMPADDING", (0, 0), (-1, -1), 5),
-        ("TOPPADDING", (0, 0), (-1, -1), 5),
-        ("LINEBELOW", (0, 0), (-1, -2), 0.5, BORDER),
-    ]))
-    story.append(st)
-    story.append(Spacer(1, 20))
+    st.setStyle(_STAMP_TABLE_STYLE)
+    story.append(KeepTogether([_para("Cryptographic Verification Stamp", "h2"), st, Spacer(1, 20)]))
 
     # ─── DISCLAIMER ───
     story.append(HRFlowable(width="100%", thickness=0.5, color=BORDER, spaceAfter=8))
-    story.append(Paragraph(
-        "LEGAL DISCLAIMER: This report is generated by VerifyAI automated multi-agent forensic analysis system. "
-        "Results are based on algorithmic analysis and do not constitute legal opinion, admissible evidence in court proceedings, "
-        "or a substitute for professional examination by a certified expert. Chain of custody is documented via SHA-256 hash "
-        "from the moment of file ingestion. The cryptographic stamp certifies that this analysis was performed — it does not "
-        "certify authenticity of the analyzed media. For cases requiring legal certainty, engagement of a certified HITL expert "
-        "is recommended. VerifyAI assumes no liability for decisions made based on this report.",
-        s["disclaimer"]
-    ))
+    story.append(_para(LEGAL_DISCLAIMER, "disclaimer"))
     story.append(Spacer(1, 8))
     story.append(Paragraph(
-        f"Report generated by VerifyAI Forensic Engine v0.1.0  |  {now.strftime('%Y-%m-%d %H:%M:%S UTC')}  |  Signature: {signature[:32]}...",
+        f"Report generated by VerifyAI Forensic Engine v0.1.0  |  {now_str}  |  Signature: {signature[:32]}...",
         s["mono_small"]
     ))
 
     # Build
     doc.build(story)
-    buffer.seek(0)
-    return buffer.read()
+    return buffer.getvalue()
@@ -1,11 +1,16 @@
+import asyncio
 import hashlib
 import os
-import uuid
+import secrets
 from pathlib import Path
-from fastapi import HTTPException
+from fastapi import HTTPException, UploadFile
 
 UPLOAD_DIR = Path("uploads")
 UPLOAD_DIR.mkdir(exist_ok=True)
+REPORT_DIR = UPLOAD_DIR / "reports"
+REPORT_DIR.mkdir(exist_ok=True)
+
+UPLOAD_CHUNK_SIZE = 1 << 20   # 1 MB
 
 # ── Magic bytes signatures ────────────────────────────────────────────────────
 # Format: (offset, bytes_to_match, media_type, label)
@@ -66,7 +71,7 @@ def validate_magic_bytes(file_bytes: bytes, declared_filename: str) -> tuple[str
     if len(file_bytes) < 12:
         raise HTTPException(status_code=400, detail="File too small to validate.")
 
-    declared_ext = declared_filename.rsplit(".", 1)[-1].lower() if "." in declared_filename else ""
+    declared_ext = _extension(declared_filename)
 
     # Special case: RIFF container
     if file_bytes[:4] == b'RIFF':
@@ -100,33 +105,75 @@ def validate_magic_bytes(file_bytes: bytes, declared_filename: str) -> tuple[str
     return magic_type, fmt
 
 
+# Extension → media type, built once at import
+_EXT_TO_TYPE = {
+    **dict.fromkeys(("jpg","jpeg","png","bmp","tiff","tif","webp","gif","heic","heif"), "image"),
+    **dict.fromkeys(("mp4","avi","mov","mkv","webm","wmv","flv","m4v"),                 "video"),
+    **dict.fromkeys(("mp3","wav","ogg","flac","m4a","aac","wma","opus","aiff","aif"),   "audio"),
+    **dict.fromkeys(("pdf","doc","docx","txt","rtf","odt","xls","xlsx","pptx"),         "document"),
+}
+
+
+def _extension(filename: str) -> str:
+    """Lower-case extension, "" if the name has no dot — one rpartition, no list."""
+    _, dot, ext = filename.rpartition(".")
+    return ext.lower() if dot else ""
+
+
 def _ext_to_type(ext: str) -> str:
-    image_exts  = {"jpg","jpeg","png","bmp","tiff","tif","webp","gif","heic","heif"}
-    video_exts  = {"mp4","avi","mov","mkv","webm","wmv","flv","m4v"}
-    audio_exts  = {"mp3","wav","ogg","flac","m4a","aac","wma","opus","aiff","aif"}
-    doc_exts    = {"pdf","doc","docx","txt","rtf","odt","xls","xlsx","pptx"}
-    if ext in image_exts:  return "image"
-    if ext in video_exts:  return "video"
-    if ext in audio_exts:  return "audio"
-    if ext in doc_exts:    return "document"
-    return "unknown"
+    return _EXT_TO_TYPE.get(ext, "unknown")
 
 
 # ── Existing helpers ──────────────────────────────────────────────────────────
 
 def compute_sha256(file_bytes: bytes) -> str:
+    # hashlib.sha256 is OpenSSL's EVP implementation (_hashlib.openssl_sha256), which
+    # dispatches to SHA-NI / ARMv8 SHA2 at runtime and releases the GIL on large inputs.
+    # Digest must stay plain SHA-256 — Case.file_hash is the chain-of-custody value.
     return hashlib.sha256(file_bytes).hexdigest()
 
 
+async def read_upload_hashed(upload: UploadFile, max_size: int) -> tuple[bytes, str]:
+    """
+    Read the upload in chunks, hashing each chunk as it arrives.
+    Returns (file_bytes, sha256 hex). Raises 413 as soon as max_size is exceeded,
+    without buffering the rest of the file.
+    """
+    h = hashlib.sha256()
+    chunks = []
+    size = 0
+    while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+        size += len(chunk)
+        if size > max_size:
+            raise HTTPException(
+                status_code=413,
+                detail=f"קובץ גדול מדי. מקסימום {max_size // (1024*1024)}MB"
+            )
+        await asyncio.to_thread(h.update, chunk)   # hashlib drops the GIL — other requests keep running
+        chunks.append(chunk)
+    return b"".join(chunks), h.hexdigest()
+
+
 def detect_media_type(filename: str) -> str:
     """Detect media type by extension (used as fallback / quick check)."""
-    ext = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
-    return _ext_to_type(ext)
+    return _ext_to_type(_extension(filename))
+
+
+def _unique_path(filename: str | None) -> Path:
+    # Client filenames are untrusted — keep only the last path component (either separator)
+    name = (filename or "").replace("\\", "/").rpartition("/")[2] or "upload"
+    return UPLOAD_DIR / f"{secrets.token_hex(16)}_{name}"
 
 
 async def save_file_locally(file_bytes: bytes, filename: str) -> str:
     """Save locally (MVP) — production will use S3/R2."""
-    unique_name = f"{uuid.uuid4()}_{filename}"
-    file_path   = UPLOAD_DIR / unique_name
-    file_path.write_bytes(file_bytes)
+    file_path = _unique_path(filename)
+    await asyncio.to_thread(file_path.write_bytes, file_bytes)   # multi-MB writes stay off the event loop
+    return str(file_path)
+
+
+async def save_report_locally(pdf_bytes: bytes, case_id: str) -> str:
+    """Store a generated PDF report (MVP: local disk, like uploads). Returns its path."""
+    file_path = REPORT_DIR / f"{case_id}.pdf"
+    await asyncio.to_thread(file_path.write_bytes, pdf_bytes)
     return str(file_path)
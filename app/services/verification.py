@@ -0,0 +1,129 @@
+"""
+Verification pipeline — run the orchestrator for a case and persist the results.
+Shared by the inline path in POST /v1/verify and the Celery worker (app.core.celery_app).
+"""
+import asyncio
+import uuid
+from functools import lru_cache
+from pathlib import Path
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import get_settings
+from app.models.models import Case, AgentResult, CrossReferenceResult
+
+ANALYSIS_TIMEOUT = 120   # seconds per full analysis
+
+# Cap on concurrent inline analyses in the API process. Bound to the event loop that created it.
+# Worker tasks each run in a fresh loop and get a fresh semaphore, so it doesn't limit the
+# worker — there the cap is Celery's pool size (worker_concurrency in app.core.celery_app).
+_case_sem: asyncio.Semaphore | None = None
+_case_sem_loop = None
+
+
+def _get_case_semaphore() -> asyncio.Semaphore:
+    global _case_sem, _case_sem_loop
+    loop = asyncio.get_running_loop()
+    if _case_sem is None or _case_sem_loop is not loop:
+        _case_sem = asyncio.Semaphore(get_settings().MAX_CONCURRENT_CASES)
+        _case_sem_loop = loop
+    return _case_sem
+
+
+@lru_cache()
+def get_orchestrator():
+    """Process-wide Orchestrator — the agents hold no per-request state, so one instance serves every case."""
+    from app.agents.orchestrator import Orchestrator
+    return Orchestrator()
+
+
+async def analyze_case(db: AsyncSession, case: Case, file_bytes: bytes, filename: str) -> dict:
+    """
+    Run the full analysis for `case` and store agent / cross-reference / red team rows.
+    On timeout or error the case is marked (status timeout/error, inconclusive, HITL)
+    and the exception is re-raised for the caller to report.
+    """
+    try:
+        # The timeout covers the analysis itself, not the wait for a slot
+        async with _get_case_semaphore():
+            analysis = await asyncio.wait_for(
+                get_orchestrator().analyze(file_bytes, filename, case.media_type),
+                timeout=ANALYSIS_TIMEOUT
+            )
+    except asyncio.TimeoutError:
+        await _mark_failed(db, case, "timeout")
+        raise
+    except Exception:
+        await _mark_failed(db, case, "error")
+        raise
+
+    # All child rows in one add_all — the ORM batches same-table INSERTs into one executemany
+    rows = [
+        AgentResult(
+            case_id=case.id,
+            agent_type=ar["agent_type"],
+            findings=ar.get("findings", {}),
+            anomalies=ar.get("anomalies", {}),
+            confidence_score=ar["confidence_score"],
+        )
+        for ar in analysis["agent_results"]
+    ]
+
+    # Red Team as AgentResult
+    rt = analysis.get("red_team", {})
+    if rt:
+        rows.append(AgentResult(
+            case_id=case.id,
+            agent_type="red_team",
+            findings={"summary": rt.get("summary", ""), "threat_level": rt.get("threat_level", "low")},
+            anomalies={"challenges": rt.get("challenges", []), "blind_spots": rt.get("blind_spots", []), "recommendations": rt.get("recommendations", [])},
+            confidence_score=1.0 - abs(rt.get("confidence_adjustment", 0)),
+        ))
+
+    rows.append(CrossReferenceResult(
+        case_id=case.id,
+        combined_score=analysis["confidence_score"],
+        reasoning=analysis["cross_reference"]["reasoning"],
+        final_verdict=analysis["verdict"],
+    ))
+    db.add_all(rows)
+
+    case.status          = "completed"
+    case.confidence_score = analysis["confidence_score"]
+    case.verdict         = analysis["verdict"]
+    case.hitl_required   = analysis["hitl_required"]
+    await db.commit()
+    return analysis
+
+
+async def _mark_failed(db: AsyncSession, case: Case, status: str) -> None:
+    case.status = status
+    case.verdict = "inconclusive"
+    case.confidence_score = 0.0
+    case.hitl_required = True
+    await db.commit()
+
+
+async def run_queued_case(case_id: str, filename: str) -> None:
+    """
+    Worker entry point: load the case and its stored file, then analyse.
+    Analysis failures are recorded on the case; only infrastructure errors
+    (DB / missing file) propagate, so the task can retry them.
+    """
+    from app.core.database import async_session, engine
+    from app.agents import vision_agents
+    try:
+        async with async_session() as db:
+            case = await db.get(Case, uuid.UUID(case_id))
+            if case is None or case.status != "pending":
+                return  # gone, or already picked up by an earlier delivery
+            file_bytes = await asyncio.to_thread(Path(case.file_url).read_bytes)
+            case.status = "processing"
+            await db.commit()
+            try:
+                await analyze_case(db, case, file_bytes, filename)
+            except Exception as e:
+                print(f"[Verification] case {case_id} failed: {e!r}")
+    finally:
+        # Each task runs in its own event loop — close the vision HTTP client and the
+        # pooled DB connections bound to it, instead of leaking their sockets until GC
+        await vision_agents.shutdown()
+        await engine.dispose()